@@ -0,0 +1,76 @@
+# crawling.py --mode http 확인용 로컬 대역 서버
+# 사용법: python crawl_fixture_server.py [--port 8081] [--fanout 4] [--delay 0.05] [--error-rate 0.05]
+#         CRAWL_BASE_URL=http://localhost:8081 \
+#         CRAWL_CHILDREN_PATH='/products/database/category/children?depth={depth}&parent={code}' \
+#         CRAWL_DETAIL_PATH='/products/database/category/detail?code={code}' \
+#         python crawling.py --mode http
+# 아래 CHILDREN_PATH / DETAIL_PATH 경로로 depth 1~4 분류 트리를 JSON으로 응답 (실제 사이트의 API 경로가 아님)
+
+from aiohttp import web
+import random
+import asyncio
+import argparse
+
+# crawling.py의 CRAWL_CHILDREN_PATH / CRAWL_DETAIL_PATH에 넣을 값
+CHILDREN_PATH = "/products/database/category/children?depth={depth}&parent={code}"
+DETAIL_PATH = "/products/database/category/detail?code={code}"
+
+
+def build_tree(fanout):
+    # 코드 -> 하위 (코드, 이름) 목록. 코드는 상위 코드에 자리수를 붙여 만들고, 일부 노드는 하위가 비어 있음
+    children = {"": [(f"{i:02d}", f"대분류{i}") for i in range(1, fanout + 1)]}
+    frontier = list(children[""])
+    for depth in range(2, 5):
+        next_frontier = []
+        for code, name in frontier:
+            count = 0 if code.endswith("3") else fanout
+            children[code] = [(f"{code}{i:02d}", f"{name}-{i}") for i in range(1, count + 1)]
+            next_frontier.extend(children[code])
+        frontier = next_frontier
+    examples = {code: ", ".join(f"{name} 상품{i}" for i in range(1, 3)) for code, name in frontier}
+    return children, examples
+
+
+def create_app(fanout, delay, error_rate):
+    children, examples = build_tree(fanout)
+    stats = {"requests": 0}
+
+    async def maybe_fail():
+        stats["requests"] += 1
+        await asyncio.sleep(delay)
+        if random.random() < error_rate:
+            raise web.HTTPTooManyRequests()
+
+    async def children_handler(request):
+        await maybe_fail()
+        code = request.query.get("parent", "")
+        if code not in children:
+            raise web.HTTPNotFound()
+        return web.json_response({"list": [{"code": c, "name": n} for c, n in children[code]]})
+
+    async def detail_handler(request):
+        await maybe_fail()
+        code = request.query.get("code", "")
+        if code not in examples:
+            raise web.HTTPNotFound()
+        return web.json_response({"code": code, "example": examples[code]})
+
+    async def report(app):
+        print(f"[INFO] 처리한 요청 수: {stats['requests']}")
+
+    app = web.Application()
+    app.router.add_get(CHILDREN_PATH.split("?")[0], children_handler)
+    app.router.add_get(DETAIL_PATH.split("?")[0], detail_handler)
+    app.on_cleanup.append(report)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="상품분류 크롤러 대역 서버")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--fanout", type=int, default=4, help="분류별 하위 분류 수")
+    parser.add_argument("--delay", type=float, default=0.05, help="응답 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429로 응답할 비율 (재시도 확인용)")
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.fanout, args.delay, args.error_rate), port=args.port)
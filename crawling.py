@@ -1,128 +1,473 @@
 # 유통상품 표준DB 상품분류 소개 크롤링
+# 사용법: python crawling.py [--mode selenium|http] [--limit-top N] [--concurrency 8] [--rate 5]
+#                            [--restart] [--full] [--max-age 초] [--upsert]
+#  - selenium: 브라우저로 분류 트리를 클릭하며 수집 (기본값)
+#  - http: 사이트가 분류 목록을 받아오는 엔드포인트를 aiohttp로 직접 호출해 하위 트리를 동시에 수집
+#          엔드포인트는 CRAWL_BASE_URL / CRAWL_CHILDREN_PATH / CRAWL_DETAIL_PATH 환경변수로 반드시 지정
+#          (로컬 확인용 대역 서버: python crawl_fixture_server.py, 실제 사이트 값은 브라우저 개발자 도구에서 확인)
+# 수집한 행은 분류가 끝날 때마다 CSV에 바로 추가한다.
+# http 모드는 끝낸 소분류를 저널에 기록해 중단되면 이어서 실행하고, 이전 실행과 세분류 목록이 같은 소분류는
+# 예시를 다시 받지 않는다. 완료 시 이전 실행 대비 변경분을 delta CSV로 남기고 --upsert면 DB에 반영한다.
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
-import time
+import os
 import csv
+import json
+import time
+import hashlib
+import pymysql
+import random
+import asyncio
+import aiohttp
+import argparse
 
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
 url = "https://www.allproductkorea.or.kr/products/database/category"
-driver.get(url)
-wait = WebDriverWait(driver, 20)
-
-result = []
-
-# 대분류 ul
-depth_1_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-1')))
-depth_1_items = depth_1_ul.find_elements(By.TAG_NAME, 'li')
-
-# 대분류 2개만 처리 (예: 0,1)
-for i1 in range(min(2, len(depth_1_items))):
-    li1 = depth_1_items[i1]
-    a1 = li1.find_element(By.TAG_NAME, 'a')
-    name1 = a1.find_element(By.CLASS_NAME, 'cls_nm').text
-
-    # 대분류 클릭
-    depth_1_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-1')))
-    depth_1_items = depth_1_ul.find_elements(By.TAG_NAME, 'li')
-    a1 = depth_1_items[i1].find_element(By.TAG_NAME, 'a')
-    driver.execute_script("arguments[0].click();", a1)
-
-    # 중분류 대기 및 수집
-    depth_2_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-2')))
-    time.sleep(0.5)
-    depth_2_items = depth_2_ul.find_elements(By.TAG_NAME, 'li')
-
-    if not depth_2_items:
-        result.append((name1, None, None, None))
-        continue
-
-    for i2, li2 in enumerate(depth_2_items):
-        a2 = li2.find_element(By.TAG_NAME, 'a')
-        name2 = a2.find_element(By.CLASS_NAME, 'cls_nm').text
-
-        # 중분류 클릭
-        depth_2_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-2')))
-        depth_2_items = depth_2_ul.find_elements(By.TAG_NAME, 'li')
-        a2 = depth_2_items[i2].find_element(By.TAG_NAME, 'a')
-        driver.execute_script("arguments[0].click();", a2)
-
-        # 소분류 대기 및 수집
-        depth_3_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-3')))
-        time.sleep(0.5)
-        depth_3_items = depth_3_ul.find_elements(By.TAG_NAME, 'li')
-
-        if not depth_3_items:
-            result.append((name1, name2, None, None))
-            continue
-
-        for i3, li3 in enumerate(depth_3_items):
-            a3 = li3.find_element(By.TAG_NAME, 'a')
-            name3 = a3.find_element(By.CLASS_NAME, 'cls_nm').text
-
-            # 소분류 클릭
-            depth_3_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-3')))
-            depth_3_items = depth_3_ul.find_elements(By.TAG_NAME, 'li')
-            a3 = depth_3_items[i3].find_element(By.TAG_NAME, 'a')
-            driver.execute_script("arguments[0].click();", a3)
-
-            # 세분류 대기 및 수집
-            depth_4_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-4')))
-            time.sleep(0.5)
-            depth_4_items = depth_4_ul.find_elements(By.TAG_NAME, 'li')
-
-            if not depth_4_items:
-                result.append((name1, name2, name3, None))
+csv_filename = "product_categories.csv"
+delta_filename = "product_categories.delta.csv"
+CSV_HEADER = ['대분류명', '중분류명', '소분류명', '세분류명', '예시']
+
+# http 모드 진행 저널(이번 실행), 직전 완료 실행의 스냅샷 (변경 감지/delta 기준)
+CRAWL_JOURNAL_PATH = os.getenv("CRAWL_JOURNAL_PATH", "crawl_journal.jsonl")
+CRAWL_SNAPSHOT_PATH = os.getenv("CRAWL_SNAPSHOT_PATH", "crawl_snapshot.json")
+# --upsert 시 categories.name으로 쓸 분류 단계 (1=대분류 ... 4=세분류), 식재료명은 가장 깊은 분류명
+CRAWL_DB_CATEGORY_LEVEL = int(os.getenv("CRAWL_DB_CATEGORY_LEVEL", 2))
+
+# http 모드 설정: {depth}는 1~4, {code}는 상위 분류 코드 (대분류 조회 시 빈 문자열)
+# 실제 사이트의 분류 목록 API 경로는 확인된 값이 없으므로 기본값을 두지 않음 (추측한 URL로 사이트에 요청하지 않도록)
+CRAWL_BASE_URL = os.getenv("CRAWL_BASE_URL", "")
+CRAWL_CHILDREN_PATH = os.getenv("CRAWL_CHILDREN_PATH", "")
+CRAWL_DETAIL_PATH = os.getenv("CRAWL_DETAIL_PATH", "")
+# 응답 JSON에서 분류 코드/이름/예시를 읽을 키
+CRAWL_CODE_KEY = os.getenv("CRAWL_CODE_KEY", "code")
+CRAWL_NAME_KEY = os.getenv("CRAWL_NAME_KEY", "name")
+CRAWL_EXAMPLE_KEY = os.getenv("CRAWL_EXAMPLE_KEY", "example")
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", 20))
+CRAWL_RETRIES = int(os.getenv("CRAWL_RETRIES", 3))
+
+# selenium 모드: 클릭 후 하위 목록이 바뀌기를 기다리는 최대 시간 (하위 목록이 이전과 같으면 이 시간 후 진행)
+CHILDREN_CHANGE_TIMEOUT = float(os.getenv("CRAWL_CHANGE_TIMEOUT", 3))
+
+
+def wait_for_children(driver, wait, depth, previous_html):
+    # 고정 sleep 대신 depth-N 목록이 나타나고 내용이 클릭 전과 달라질 때까지 대기
+    ul = wait.until(EC.presence_of_element_located((By.ID, f'depth-{depth}')))
+    try:
+        WebDriverWait(driver, CHILDREN_CHANGE_TIMEOUT, poll_frequency=0.05).until(
+            lambda d: d.find_element(By.ID, f'depth-{depth}').get_attribute('innerHTML') != previous_html
+        )
+        ul = driver.find_element(By.ID, f'depth-{depth}')
+    except TimeoutException:
+        pass
+    return ul.find_elements(By.TAG_NAME, 'li')
+
+
+def current_html(driver, depth):
+    elements = driver.find_elements(By.ID, f'depth-{depth}')
+    return elements[0].get_attribute('innerHTML') if elements else None
+
+
+def click_item(driver, wait, depth, index):
+    # 클릭할 때마다 목록이 다시 그려지므로 ul을 새로 찾아 index번째 항목을 클릭
+    ul = wait.until(EC.presence_of_element_located((By.ID, f'depth-{depth}')))
+    a = ul.find_elements(By.TAG_NAME, 'li')[index].find_element(By.TAG_NAME, 'a')
+    driver.execute_script("arguments[0].click();", a)
+
+
+def item_name(li):
+    return li.find_element(By.TAG_NAME, 'a').find_element(By.CLASS_NAME, 'cls_nm').text
+
+
+def crawl_selenium(sink, limit_top=None):
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
+    driver.get(url)
+    wait = WebDriverWait(driver, 20)
+
+    try:
+        # 대분류 ul
+        depth_1_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-1')))
+        depth_1_items = depth_1_ul.find_elements(By.TAG_NAME, 'li')
+        top_count = len(depth_1_items) if limit_top is None else min(limit_top, len(depth_1_items))
+
+        for i1 in range(top_count):
+            name1 = item_name(wait.until(EC.presence_of_element_located((By.ID, 'depth-1'))).find_elements(By.TAG_NAME, 'li')[i1])
+
+            # 대분류 클릭 후 중분류 대기 및 수집
+            previous = current_html(driver, 2)
+            click_item(driver, wait, 1, i1)
+            depth_2_items = wait_for_children(driver, wait, 2, previous)
+
+            if not depth_2_items:
+                sink.write([(name1, None, None, None, '')])
                 continue
 
-            for li4 in depth_4_items:
-                a4 = li4.find_element(By.TAG_NAME, 'a')
-                name4 = a4.find_element(By.CLASS_NAME, 'cls_nm').text
+            for i2, li2 in enumerate(depth_2_items):
+                name2 = item_name(li2)
 
-                # 세분류 클릭
-                depth_4_ul = wait.until(EC.presence_of_element_located((By.ID, 'depth-4')))
-                depth_4_items = depth_4_ul.find_elements(By.TAG_NAME, 'li')
-                a4 = depth_4_items[depth_4_items.index(li4)].find_element(By.TAG_NAME, 'a')
-                driver.execute_script("arguments[0].click();", a4)
+                # 중분류 클릭 후 소분류 대기 및 수집
+                previous = current_html(driver, 3)
+                click_item(driver, wait, 2, i2)
+                depth_3_items = wait_for_children(driver, wait, 3, previous)
 
-                # 세분류 클릭 후 'notEmpty' 영역 대기 및 예시 수집
-                wait.until(EC.visibility_of_element_located((By.ID, 'notEmpty')))
-                example = ''
-                try:
-                    example_elem = driver.find_element(By.ID, 'example')
-                    example = example_elem.text.strip()
-                except:
-                    example = ''
+                if not depth_3_items:
+                    sink.write([(name1, name2, None, None, '')])
+                    continue
 
-                result.append((name1, name2, name3, name4, example))
+                for i3, li3 in enumerate(depth_3_items):
+                    name3 = item_name(li3)
 
-# 결과 출력
-for row in result:
-    print(f"대분류: {row[0]}, 중분류: {row[1]}, 소분류: {row[2]}, 세분류: {row[3]}, 예시: {row[4]}")
+                    # 소분류 클릭 후 세분류 대기 및 수집
+                    previous = current_html(driver, 4)
+                    click_item(driver, wait, 3, i3)
+                    depth_4_items = wait_for_children(driver, wait, 4, previous)
+
+                    if not depth_4_items:
+                        sink.write([(name1, name2, name3, None, '')])
+                        continue
+
+                    for i4, li4 in enumerate(depth_4_items):
+                        name4 = item_name(li4)
+
+                        # 세분류 클릭 후 'notEmpty' 영역 대기 및 예시 수집
+                        click_item(driver, wait, 4, i4)
+                        wait.until(EC.visibility_of_element_located((By.ID, 'notEmpty')))
+                        try:
+                            example = driver.find_element(By.ID, 'example').text.strip()
+                        except Exception:
+                            example = ''
+
+                        sink.write([(name1, name2, name3, name4, example)])
+    finally:
+        driver.quit()
+
+
+class RateLimiter:
+    """초당 rate회로 요청 시작을 제한하는 토큰 버킷 (사이트 부하 방지)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CategoryClient:
+    """분류 트리 엔드포인트용 aiohttp 세션 (연결 재사용, 동시성/속도 제한, 429/5xx 재시도)."""
+
+    def __init__(self, session, limiter, concurrency):
+        self.session = session
+        self.limiter = limiter
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def get_json(self, path):
+        for attempt in range(CRAWL_RETRIES + 1):
+            await self.limiter.acquire()
+            try:
+                async with self._slots, self.session.get(CRAWL_BASE_URL + path) as res:
+                    if res.status != 429 and res.status < 500:
+                        res.raise_for_status()
+                        return await res.json(content_type=None)
+                    error = aiohttp.ClientResponseError(res.request_info, res.history, status=res.status)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            if attempt == CRAWL_RETRIES:
+                raise error
+            await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+    async def children(self, depth, code=""):
+        payload = await self.get_json(CRAWL_CHILDREN_PATH.format(depth=depth, code=code))
+        # 목록이 바로 오거나 {"list": [...]}처럼 한 단계 감싸져 오는 경우 모두 처리
+        if isinstance(payload, dict):
+            payload = next((v for v in payload.values() if isinstance(v, list)), [])
+        return [(str(item[CRAWL_CODE_KEY]), item[CRAWL_NAME_KEY].strip()) for item in payload]
+
+    async def example(self, code):
+        payload = await self.get_json(CRAWL_DETAIL_PATH.format(code=code))
+        return (payload.get(CRAWL_EXAMPLE_KEY) or '').strip()
+
+
+class CsvSink:
+    """수집한 행을 바로 CSV에 추가 (예시가 여러 개면 예시별로 한 행). 이어서 실행할 때는 기존 파일 뒤에 붙임."""
+
+    def __init__(self, path, append=False):
+        append = append and os.path.exists(path)
+        self._file = open(path, mode='a' if append else 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file)
+        if not append:
+            self._writer.writerow(CSV_HEADER)
+        self.rows = 0
+
+    def write(self, rows):
+        for row in rows:
+            # row = (대분류명, 중분류명, 소분류명, 세분류명, 예시)
+            print(f"대분류: {row[0]}, 중분류: {row[1]}, 소분류: {row[2]}, 세분류: {row[3]}, 예시: {row[4]}")
+            example_list = [e.strip() for e in row[4].split(',')] if row[4] else ['']
+            for example in example_list:
+                self._writer.writerow((row[0], row[1], row[2], row[3], example))
+            self.rows += 1
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def path_key(path):
+    return " > ".join(path)
 
-csv_filename = "product_categories.csv"
-final_result = []
 
-for row in result:
-    # row = (대분류명, 중분류명, 소분류명, 세분류명, 예시)
-    examples = row[4]
-    if examples:
-        example_list = [e.strip() for e in examples.split(',')]
+class CrawlJournal:
+    """http 모드 진행 기록.
+
+    끝낸 하위 트리(소분류, 또는 더 내려갈 분류가 없는 노드)마다 한 줄씩 JSONL로 추가해 중단 후 이어서 실행하고,
+    완료되면 스냅샷으로 바꿔 다음 실행의 변경 감지 기준으로 쓴다.
+    """
+
+    def __init__(self, restart=False):
+        self.previous = {}
+        if os.path.exists(CRAWL_SNAPSHOT_PATH):
+            with open(CRAWL_SNAPSHOT_PATH, encoding="utf-8") as f:
+                self.previous = json.load(f)
+
+        self.done = {}
+        self.resumed = not restart and os.path.exists(CRAWL_JOURNAL_PATH)
+        if self.resumed:
+            with open(CRAWL_JOURNAL_PATH, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 중단 시점에 잘린 마지막 줄
+                    self.done[path_key(entry["path"])] = entry
+
+        self.stats = {"fetched": 0, "reused": 0, "resumed": len(self.done)}
+        self._file = open(CRAWL_JOURNAL_PATH, "a" if self.resumed else "w", encoding="utf-8")
+
+    def record(self, path, listing_hash, rows, crawled_at):
+        entry = {"path": list(path), "hash": listing_hash, "rows": [list(row) for row in rows], "crawledAt": crawled_at}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.done[path_key(path)] = entry
+
+    def finish(self):
+        # 이번 실행 결과를 스냅샷으로 교체하고 저널 삭제
+        self._file.close()
+        tmp_path = CRAWL_SNAPSHOT_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.done, f, ensure_ascii=False)
+        os.replace(tmp_path, CRAWL_SNAPSHOT_PATH)
+        os.remove(CRAWL_JOURNAL_PATH)
+
+    def close(self):
+        self._file.close()
+
+
+def listing_hash(children):
+    return hashlib.sha1(json.dumps(children, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+async def crawl_subtree(client, depth, code, path, journal, sink, full=False, max_age=None):
+    # path: 상위 분류명 튜플. 하위 분류는 동시에 요청하고, 하위 트리가 끝날 때마다 CSV와 저널에 기록
+    key = path_key(path)
+    if key in journal.done:
+        return
+
+    children = await client.children(depth, code)
+    current_hash = listing_hash(children)
+    crawled_at = time.time()
+
+    if not children:
+        rows = [(*path, *[None] * (4 - len(path)), '')]
+    elif depth == 4:
+        # 세분류 목록이 이전 실행과 같으면 예시를 다시 받지 않음 (--full 또는 max_age 초과 시 다시 받음)
+        previous = journal.previous.get(key)
+        if (not full and previous is not None and previous["hash"] == current_hash
+                and (max_age is None or crawled_at - previous["crawledAt"] < max_age)):
+            rows = [tuple(row) for row in previous["rows"]]
+            crawled_at = previous["crawledAt"]
+            journal.stats["reused"] += 1
+        else:
+            examples = await asyncio.gather(*[client.example(child_code) for child_code, _ in children])
+            rows = [(*path, name, example) for (_, name), example in zip(children, examples)]
+            journal.stats["fetched"] += 1
     else:
-        example_list = ['']  # 예시가 없으면 빈 문자열
-    
-    for example in example_list:
-        final_result.append((row[0], row[1], row[2], row[3], example))
-
-# final_result를 csv로 저장
-with open(csv_filename, mode='w', newline='', encoding='utf-8-sig') as f:
-    writer = csv.writer(f)
-    writer.writerow(['대분류명', '중분류명', '소분류명', '세분류명', '예시'])
-    for r in final_result:
-        writer.writerow(r)
-
-print(f"{csv_filename} 파일로 저장 완료")
+        await asyncio.gather(*[
+            crawl_subtree(client, depth + 1, child_code, (*path, name), journal, sink, full, max_age)
+            for child_code, name in children
+        ])
+        return
+
+    sink.write(rows)
+    journal.record(path, current_hash, rows, crawled_at)
+
+
+def missing_http_settings():
+    settings = {
+        "CRAWL_BASE_URL": CRAWL_BASE_URL,
+        "CRAWL_CHILDREN_PATH": CRAWL_CHILDREN_PATH,
+        "CRAWL_DETAIL_PATH": CRAWL_DETAIL_PATH,
+    }
+    return [name for name, value in settings.items() if not value]
+
+
+async def crawl_http(sink, journal, limit_top=None, concurrency=8, rate=5.0, full=False, max_age=None):
+    missing = missing_http_settings()
+    if missing:
+        raise ValueError(f"http 모드에는 {', '.join(missing)} 환경변수가 필요합니다")
+
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=CRAWL_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        client = CategoryClient(session, RateLimiter(rate, burst=concurrency), concurrency)
+        top = await client.children(1)
+        if limit_top is not None:
+            top = top[:limit_top]
+
+        await asyncio.gather(*[
+            crawl_subtree(client, 2, code, (name,), journal, sink, full, max_age) for code, name in top
+        ])
+
+
+def diff_rows(previous, current):
+    # 세분류 경로 기준으로 이전/현재 스냅샷 비교 -> [(변경 유형, row)]
+    old = {tuple(row[:4]): tuple(row) for entry in previous.values() for row in entry["rows"]}
+    new = {tuple(row[:4]): tuple(row) for entry in current.values() for row in entry["rows"]}
+
+    delta = [("added", row) for key, row in new.items() if key not in old]
+    delta += [("changed", row) for key, row in new.items() if key in old and old[key] != row]
+    delta += [("removed", row) for key, row in old.items() if key not in new]
+    return delta
+
+
+def write_delta(delta):
+    with open(delta_filename, mode='w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['변경', *CSV_HEADER])
+        for change, row in delta:
+            writer.writerow((change, *row))
+
+    print(f"{delta_filename} 파일로 변경분 {len(delta)}건 저장 완료")
+
+
+def upsert_rows(rows):
+    # 추가/변경된 분류를 sync_to_es.py가 읽는 categories/ingredients 테이블에 반영
+    # 실제로 바뀐 식재료만 updatedAt을 갱신해 카탈로그/ES 증분 동기화가 변경분만 가져가도록 함 (삭제는 하지 않음)
+    conn = pymysql.connect(
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        port=int(os.getenv("DB_PORT"))
+    )
+    category_ids = {}
+    stats = {"inserted": 0, "updated": 0}
+
+    try:
+        with conn.cursor() as cursor:
+            for row in rows:
+                names = [name for name in row[:4] if name]
+                category = row[CRAWL_DB_CATEGORY_LEVEL - 1] or names[-1]
+                ingredient = names[-1]
+
+                if category not in category_ids:
+                    cursor.execute("SELECT id FROM categories WHERE name = %s", (category,))
+                    found = cursor.fetchone()
+                    if found is None:
+                        cursor.execute("INSERT INTO categories (name) VALUES (%s)", (category,))
+                        category_ids[category] = cursor.lastrowid
+                    else:
+                        category_ids[category] = found[0]
+
+                cursor.execute("SELECT id, categoryId FROM ingredients WHERE name = %s", (ingredient,))
+                found = cursor.fetchone()
+                if found is None:
+                    cursor.execute(
+                        "INSERT INTO ingredients (name, categoryId, updatedAt) VALUES (%s, %s, NOW())",
+                        (ingredient, category_ids[category])
+                    )
+                    stats["inserted"] += 1
+                elif found[1] != category_ids[category]:
+                    cursor.execute(
+                        "UPDATE ingredients SET categoryId = %s, updatedAt = NOW() WHERE id = %s",
+                        (category_ids[category], found[0])
+                    )
+                    stats["updated"] += 1
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f"[INFO] DB 반영 완료: 추가 {stats['inserted']}건, 변경 {stats['updated']}건")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="유통상품 표준DB 상품분류 크롤러")
+    parser.add_argument("--mode", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--limit-top", type=int, help="앞에서부터 N개 대분류만 수집 (기본: 전체)")
+    parser.add_argument("--concurrency", type=int, default=8, help="http 모드 동시 요청 수")
+    parser.add_argument("--rate", type=float, default=5.0, help="http 모드 초당 최대 요청 수")
+    parser.add_argument("--restart", action="store_true", help="http 모드: 중단된 실행을 이어가지 않고 처음부터")
+    parser.add_argument("--full", action="store_true", help="http 모드: 세분류 목록이 같아도 예시를 모두 다시 수집")
+    parser.add_argument("--max-age", type=float, help="http 모드: 예시를 받은 지 이 시간(초)이 지난 소분류는 다시 수집")
+    parser.add_argument("--upsert", action="store_true", help="http 모드: 변경분을 categories/ingredients 테이블에 반영")
+    args = parser.parse_args()
+
+    if args.mode == "http" and missing_http_settings():
+        parser.error(
+            f"--mode http에는 {', '.join(missing_http_settings())} 환경변수가 필요합니다. "
+            "실제 사이트의 분류 목록 API 경로를 브라우저 개발자 도구에서 확인해 지정하거나, "
+            "crawl_fixture_server.py 대역 서버로 확인하세요 (README 참고)"
+        )
+
+    started = time.time()
+    if args.mode == "http":
+        journal = CrawlJournal(args.restart)
+        if journal.resumed:
+            print(f"[INFO] 이전 실행에서 이어서 수집: 완료된 하위 트리 {len(journal.done)}개")
+        sink = CsvSink(csv_filename, append=journal.resumed)
+        try:
+            asyncio.run(crawl_http(sink, journal, args.limit_top, args.concurrency, args.rate, args.full, args.max_age))
+        except BaseException:
+            journal.close()
+            raise
+        finally:
+            sink.close()
+
+        previous = journal.previous
+        journal.finish()
+        print(f"[INFO] 소분류 예시 수집 {journal.stats['fetched']}개, 변경 없음 {journal.stats['reused']}개, "
+              f"이전 실행에서 완료 {journal.stats['resumed']}개")
+
+        if previous:
+            delta = diff_rows(previous, journal.done)
+            write_delta(delta)
+            changed_rows = [row for change, row in delta if change != "removed"]
+        else:
+            changed_rows = [tuple(row) for entry in journal.done.values() for row in entry["rows"]]
+
+        if args.upsert and changed_rows:
+            upsert_rows(changed_rows)
+    else:
+        sink = CsvSink(csv_filename)
+        try:
+            crawl_selenium(sink, args.limit_top)
+        finally:
+            sink.close()
+
+    print(f"{csv_filename} 파일로 저장 완료")
+    print(f"{sink.rows}개 분류 수집 ({time.time() - started:.1f}s)")
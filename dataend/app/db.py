@@ -1,8 +1,79 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
 
 import os
 
-engine = create_engine(
-    f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
-    f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-)
\ No newline at end of file
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+# MySQL wait_timeout보다 짧게 재연결
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", 1000))
+
+
+def _db_url(driver):
+    return (
+        f"mysql+{driver}://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+        f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+    )
+
+
+_pool_options = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=DB_POOL_RECYCLE
+)
+
+# API 서버는 async_engine, 동기 스크립트(sync_to_es.py 등)는 engine 사용
+engine = create_engine(_db_url("pymysql"), **_pool_options)
+async_engine = create_async_engine(_db_url("aiomysql"), **_pool_options)
+
+_INGREDIENT_COLUMNS = """
+    SELECT i.id as ingredientId,
+        i.name as ingredientName,
+        i.updatedAt,
+        c.id as categoryId,
+        c.name as categoryName
+    FROM ingredients i
+    JOIN categories c ON i.categoryId = c.id
+"""
+
+FULL_LOAD_QUERY = text(_INGREDIENT_COLUMNS)
+DELTA_LOAD_QUERY = text(_INGREDIENT_COLUMNS + " WHERE i.updatedAt >= :watermark")
+BY_ID_QUERY = text(_INGREDIENT_COLUMNS + " WHERE i.id = :ingredient_id")
+CHECKSUM_QUERY = text("""
+    SELECT COUNT(*) as cnt,
+        COALESCE(BIT_XOR(i.id), 0) as idXor
+    FROM ingredients i
+    JOIN categories c ON i.categoryId = c.id
+""")
+# ES keyword(ingredientId) 정렬 순서와 맞추기 위해 ID를 문자열로 정렬
+STREAM_QUERY = text(_INGREDIENT_COLUMNS + " ORDER BY CAST(i.id AS CHAR)")
+STREAM_AFTER_QUERY = text(_INGREDIENT_COLUMNS + " WHERE CAST(i.id AS CHAR) > :after_id ORDER BY CAST(i.id AS CHAR)")
+
+
+async def fetch_all_ingredients():
+    async with async_engine.connect() as conn:
+        return (await conn.execute(FULL_LOAD_QUERY)).all()
+
+
+async def fetch_ingredients_since(watermark):
+    async with async_engine.connect() as conn:
+        return (await conn.execute(DELTA_LOAD_QUERY, {"watermark": watermark})).all()
+
+
+async def fetch_ingredient_by_id(ingredient_id: int):
+    async with async_engine.connect() as conn:
+        return (await conn.execute(BY_ID_QUERY, {"ingredient_id": ingredient_id})).first()
+
+
+async def fetch_catalog_checksum():
+    async with async_engine.connect() as conn:
+        return (await conn.execute(CHECKSUM_QUERY)).one()
+
+
+def stream_ingredients(after_id: str = None, batch_size: int = DB_STREAM_BATCH_SIZE):
+    """서버 사이드 커서로 식재료 행을 문자열 ID 순서대로 스트리밍 (동기 스크립트용)."""
+    query, params = (STREAM_QUERY, {}) if after_id is None else (STREAM_AFTER_QUERY, {"after_id": after_id})
+    with engine.connect().execution_options(stream_results=True, yield_per=batch_size) as conn:
+        yield from conn.execute(query, params)
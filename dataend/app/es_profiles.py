@@ -0,0 +1,166 @@
+import os
+import copy
+
+# 색인(sync_to_es.py)과 검색(search_es)이 같은 값을 써야 하며, 바꾼 뒤에는 --reindex 필요
+ANALYSIS_PROFILE = os.getenv("ES_ANALYSIS_PROFILE", "ngram")
+
+_CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+_JUNGSEONG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+_JONGSEONG = ["", *"ㄱㄲㄳㄴㄵㄶㄷㄹㄺㄻㄼㄽㄾㄿㅀㅁㅂㅄㅅㅆㅇㅈㅊㅋㅌㅍㅎ"]
+
+
+def decompose_jamo(text: str) -> str:
+    # 한글 음절을 초성/중성/종성 자모로 분해 (오타에 강한 매칭용)
+    result = []
+    for ch in text:
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            result.append(_CHOSEONG[code // 588])
+            result.append(_JUNGSEONG[(code % 588) // 28])
+            result.append(_JONGSEONG[code % 28])
+        elif not ch.isspace():
+            result.append(ch)
+    return "".join(result)
+
+
+def _ngram_tokenizer(min_gram, max_gram):
+    return {"type": "ngram", "min_gram": min_gram, "max_gram": max_gram, "token_chars": ["letter", "digit"]}
+
+
+def _edge_ngram_tokenizer(max_gram):
+    return {"type": "edge_ngram", "min_gram": 1, "max_gram": max_gram, "token_chars": ["letter", "digit"]}
+
+
+# 기존 프로필: index/search 모두 2~20 ngram
+_LEGACY_NGRAM = {
+    "settings": {
+        "index": {
+            "max_ngram_diff": 20,
+            "number_of_shards": 1,
+            "number_of_replicas": 1
+        },
+        "analysis": {
+            "analyzer": {
+                "korean_ngram_analyzer": {
+                    "type": "custom",
+                    "tokenizer": "korean_ngram_tokenizer"
+                },
+                "korean_edge_ngram_analyzer": {
+                    "type": "custom",
+                    "tokenizer": "korean_edge_ngram_tokenizer"
+                }
+            },
+            "tokenizer": {
+                "korean_ngram_tokenizer": _ngram_tokenizer(2, 20),
+                "korean_edge_ngram_tokenizer": _edge_ngram_tokenizer(20)
+            }
+        }
+    },
+    "mappings": {
+        "properties": {
+            "ingredientId": {"type": "keyword"},
+            "categoryId": {"type": "keyword"},
+            "ingredientName": {
+                "type": "text",
+                "analyzer": "korean_ngram_analyzer",
+                "search_analyzer": "korean_ngram_analyzer",
+                "fields": {
+                    "edge": {
+                        "type": "text",
+                        "analyzer": "korean_edge_ngram_analyzer",
+                        "search_analyzer": "korean_edge_ngram_analyzer"
+                    },
+                    "keyword": {"type": "keyword"}
+                }
+            },
+            "ingredientName_nospace": {
+                "type": "text",
+                "analyzer": "korean_ngram_analyzer",
+                "search_analyzer": "korean_ngram_analyzer"
+            },
+            "categoryName": {"type": "keyword"},
+            "updatedAt": {"type": "date"}
+        }
+    }
+}
+
+
+def _bounded_profile(name_analyzer=None, jamo=False):
+    # 2~3 gram + edge ngram(검색 시 standard 분석) 기반 경량 프로필
+    mapping = copy.deepcopy(_LEGACY_NGRAM)
+    settings = mapping["settings"]
+    properties = mapping["mappings"]["properties"]
+
+    settings["index"]["max_ngram_diff"] = 1
+    settings["analysis"]["tokenizer"] = {
+        "korean_ngram_tokenizer": _ngram_tokenizer(2, 3),
+        "korean_edge_ngram_tokenizer": _edge_ngram_tokenizer(10)
+    }
+    properties["ingredientName"]["fields"]["edge"]["search_analyzer"] = "standard"
+
+    if name_analyzer is not None:
+        settings["analysis"]["analyzer"].update(name_analyzer)
+        analyzer_name = next(iter(name_analyzer))
+        properties["ingredientName"]["analyzer"] = analyzer_name
+        properties["ingredientName"]["search_analyzer"] = analyzer_name
+
+    if jamo:
+        properties["ingredientName_jamo"] = {
+            "type": "text",
+            "analyzer": "korean_ngram_analyzer",
+            "search_analyzer": "korean_ngram_analyzer"
+        }
+
+    return mapping
+
+
+PROFILES = {
+    "ngram": _LEGACY_NGRAM,
+    "bigram": _bounded_profile(),
+    # analysis-nori 플러그인이 설치된 ES에서만 사용 가능
+    "nori": _bounded_profile(name_analyzer={
+        "korean_nori_analyzer": {
+            "type": "custom",
+            "tokenizer": "nori_tokenizer",
+            "filter": ["lowercase"]
+        }
+    }),
+    "jamo": _bounded_profile(jamo=True),
+}
+
+
+def build_mapping(profile: str = ANALYSIS_PROFILE) -> dict:
+    mapping = copy.deepcopy(PROFILES[profile])
+    mapping["mappings"]["_meta"] = {"analysis_profile": profile}
+    return mapping
+
+
+def to_document(source: dict, profile: str = ANALYSIS_PROFILE) -> dict:
+    # 색인 시 프로필별 파생 필드 추가
+    doc = dict(source)
+    doc["ingredientName_nospace"] = source["ingredientName"].replace(" ", "")
+    if "ingredientName_jamo" in PROFILES[profile]["mappings"]["properties"]:
+        doc["ingredientName_jamo"] = decompose_jamo(source["ingredientName"])
+    return doc
+
+
+def build_query(name: str, size: int, profile: str = ANALYSIS_PROFILE) -> dict:
+    should = [
+        {"term": {"ingredientName.keyword": {"value": name.strip(), "boost": 10}}},
+        {"match": {"ingredientName_nospace": {"query": name, "boost": 5}}},
+        {"match": {"ingredientName.edge": {"query": name, "boost": 3}}},
+        {"match": {"ingredientName": {"query": name, "boost": 2, "fuzziness": "AUTO"}}}
+    ]
+
+    if profile in ("bigram", "jamo"):
+        # 2~3 gram은 토큰 수가 적으므로 일정 비율 이상 겹칠 때만 매칭
+        should[1]["match"]["ingredientName_nospace"]["minimum_should_match"] = "50%"
+
+    if "ingredientName_jamo" in PROFILES[profile]["mappings"]["properties"]:
+        should.append({"match": {"ingredientName_jamo": {"query": decompose_jamo(name), "boost": 2}}})
+
+    return {
+        "query": {"bool": {"should": should}},
+        "_source": ["ingredientId", "ingredientName", "ingredientName_nospace", "categoryName", "categoryId"],
+        "size": size
+    }
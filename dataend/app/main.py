@@ -1,34 +1,156 @@
-from fastapi import FastAPI, Query, File, UploadFile
-from services import search_es, remap_wrapper, ask_openai_for_detect
+from fastapi import FastAPI, Query, File, UploadFile, HTTPException, Depends
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from repositories import catalog_manager
+from services import search_es_batch, remap_batch_wrapper, iter_remap_results, ask_openai_for_detect, detect_ingredients_batch
+from uploads import UploadLimitMiddleware, spooled_upload, DETECT_MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES
+from observability import TimingMiddleware, setup_logging, shutdown_logging
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from contextlib import AsyncExitStack, asynccontextmanager
+from collections import Counter
+from typing import Annotated, Literal
 
-import asyncio
+import os
+import json
+import time
+import logging
 
-app = FastAPI()
+DETECT_MAX_BATCH_IMAGES = int(os.getenv("DETECT_MAX_BATCH_IMAGES", 10))
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 카탈로그는 백그라운드에서 로드/갱신하고, 준비되기 전까지는 /health가 ready=false를 반환
+    catalog_manager.start()
+    yield
+    await catalog_manager.stop()
+    shutdown_logging()
+
+def require_catalog():
+    if not catalog_manager.ready:
+        raise HTTPException(status_code=503, detail="식재료 목록을 불러오는 중입니다")
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/detect": DETECT_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/detect/batch": (DETECT_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES) * DETECT_MAX_BATCH_IMAGES
+})
+# 가장 바깥에서 감싸 업로드 크기 제한(413) 응답까지 포함해 측정
+app.add_middleware(TimingMiddleware, paths=["/", "/health", "/health/ready", "/health/live", "/metrics", "/search", "/detect", "/detect/batch"])
 
 @app.get("/")
 def root():
     return "FastAPI Is Running!"
 
-@app.get("/search")
-async def search_products(ingredient_names: list[str] = Query(...)):
+@app.get("/health")
+def health():
+    status = catalog_manager.health()
+    return JSONResponse(status, status_code=200 if status["ready"] and status["live"] else 503)
+
+# 오케스트레이터 프로브용: readiness 실패는 트래픽에서만 빼고, liveness 실패는 재시작 대상
+# (카탈로그가 오래되었어도 이전 스냅샷으로 계속 응답할 수 있으므로 재시작 여부만 liveness로 판단)
+@app.get("/health/ready")
+def health_ready():
+    status = catalog_manager.health()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/health/live")
+def health_live():
+    status = catalog_manager.health()
+    return JSONResponse(status, status_code=200 if status["live"] else 503)
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/search", dependencies=[Depends(require_catalog)])
+async def search_products(
+    ingredient_names: list[str] = Query(...),
+    stream: Annotated[Literal["ndjson", "sse"] | None, Query()] = None
+):
+    if stream is not None:
+        # 항목별로 준비되는 대로 보내는 스트리밍 모드 (기본 응답 형식은 그대로)
+        media_type = "application/x-ndjson" if stream == "ndjson" else "text/event-stream"
+        return StreamingResponse(
+            stream_search(ingredient_names, stream), media_type=media_type,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    # 같은 이름이 여러 번 들어와도 검색/매핑은 한 번만 하고, 응답은 입력 순서대로 다시 펼침
+    unique_names = list(dict.fromkeys(ingredient_names))
     
-    es_tasks = [search_es(name, "products") for name in ingredient_names]
-    es_results = await asyncio.gather(*es_tasks)
+    es_results = await search_es_batch(unique_names, "products")
     
-    for i in es_results:
-        print(*i)
+    if logger.isEnabledFor(logging.DEBUG):
+        for name, hits in es_results:
+            logger.debug("%s %s", name, [(hit["ingredientName"], hit["score"], hit["matchType"]) for hit in hits[:2]])
 
-    remap_tasks = [remap_wrapper(name, top_name) for name, top_name in es_results]
-    remap_results = await asyncio.gather(*remap_tasks)
+    remap_results = await remap_batch_wrapper(es_results)
+    remap_by_name = dict(zip(unique_names, remap_results))
+    remap_results = [remap_by_name[name] for name in ingredient_names]
     
     final_results = [r for r in remap_results if r and r["ingredientName"] != "제외"]
     
     return final_results
 
-@app.post("/detect")
+def _stream_record(record: dict, stream: str) -> str:
+    data = json.dumps(record, ensure_ascii=False)
+    return f"{data}\n" if stream == "ndjson" else f"event: {record['type']}\ndata: {data}\n\n"
+
+async def stream_search(ingredient_names: list[str], stream: str):
+    # 레코드: {"type": "item", "index": 입력 순번, "path": 처리 경로, "result": {...}} ... {"type": "summary", ...}
+    # ES 결과로 확정되거나 캐시된 항목이 먼저, LLM으로 매핑한 항목이 뒤따름. '제외' 항목도 result에 그대로 담아 보냄
+    started = time.perf_counter()
+    unique_names = list(dict.fromkeys(ingredient_names))
+    positions = {}
+    for index, name in enumerate(ingredient_names):
+        positions.setdefault(name, []).append(index)
+
+    paths = Counter()
+    excluded = 0
+    try:
+        es_results = await search_es_batch(unique_names, "products")
+        async for i, result, path in iter_remap_results(es_results):
+            for index in positions[unique_names[i]]:
+                paths[path] += 1
+                excluded += result["ingredientName"] == "제외"
+                yield _stream_record({"type": "item", "index": index, "path": path, "result": result}, stream)
+    except Exception as e:
+        logger.exception("streaming search failed")
+        yield _stream_record({"type": "error", "detail": str(e)}, stream)
+
+    yield _stream_record({
+        "type": "summary",
+        "count": sum(paths.values()),
+        "total": len(ingredient_names),
+        "excluded": excluded,
+        "paths": dict(paths),
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 1)
+    }, stream)
+
+@app.post("/detect", dependencies=[Depends(require_catalog)])
 async def detect_ingredients(image: UploadFile = File(...)):
-    image_bytes = await image.read()
-    
-    results = ask_openai_for_detect(image_bytes)
+    # 업로드 전체를 메모리에 올리지 않고 임시 파일로 옮긴 뒤 경로만 전달
+    async with spooled_upload(image) as (image_path, image_hash):
+        try:
+            results = await ask_openai_for_detect(image_path, image_hash)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
+    return results
+
+@app.post("/detect/batch", dependencies=[Depends(require_catalog)])
+async def detect_ingredients_bulk(images: list[UploadFile] = File(...)):
+    if len(images) > DETECT_MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"이미지는 최대 {DETECT_MAX_BATCH_IMAGES}장까지 업로드할 수 있습니다")
+
+    # 모든 이미지를 임시 파일로 받은 뒤 동시에 인식하고, 이미지별 결과와 합친 결과를 함께 반환
+    async with AsyncExitStack() as stack:
+        spooled = [await stack.enter_async_context(spooled_upload(image)) for image in images]
+        results = await detect_ingredients_batch(spooled)
+
+    for image_result in results["images"]:
+        image_result["filename"] = images[image_result["index"]].filename
+
     return results
\ No newline at end of file
@@ -0,0 +1,129 @@
+from prometheus_client import Counter, Gauge, Histogram
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+import os
+import time
+import queue
+import logging
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# true이면 응답에 단계별 소요 시간을 Server-Timing 헤더로 붙임
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "false").lower() == "true"
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_BYTES_BUCKETS = tuple(2 ** i * 1024 for i in range(4, 15, 2))  # 16KB ~ 16MB
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP 요청 처리 시간", ["path", "status"], buckets=_LATENCY_BUCKETS
+)
+ES_QUERY_SECONDS = Histogram(
+    "es_query_duration_seconds", "Elasticsearch 요청 시간", ["operation"], buckets=_LATENCY_BUCKETS
+)
+LOCAL_MATCH_SECONDS = Histogram(
+    "local_match_duration_seconds", "프로세스 내 매처 채점 시간 (요청 단위)", buckets=(0.0005, 0.001, *_LATENCY_BUCKETS)
+)
+MATCHER_FALLBACKS = Counter("matcher_fallback_total", "ES 실패/지연으로 로컬 매처를 사용한 횟수", ["reason"])
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds", "OpenAI 호출 시간 (재시도 포함)", ["endpoint", "outcome"], buckets=_LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter("llm_tokens_total", "OpenAI 사용 토큰 수", ["endpoint", "kind"])
+LLM_RETRIES = Counter("llm_retries_total", "OpenAI 재시도 횟수", ["endpoint"])
+REMAP_PATHS = Counter("remap_path_total", "remap 처리 경로별 건수 (exact/margin/cache/llm/coalesced)", ["path"])
+DETECT_CACHE = Counter("detect_cache_total", "detect 결과 캐시 조회", ["result"])
+DETECT_UPLOAD_BYTES = Histogram("detect_upload_bytes", "업로드된 원본 이미지 크기", buckets=_BYTES_BUCKETS)
+DETECT_PAYLOAD_BYTES = Histogram("detect_payload_bytes", "전처리 후 모델로 보내는 data URL 크기", buckets=_BYTES_BUCKETS)
+CATALOG_REFRESH_SECONDS = Histogram(
+    "catalog_refresh_duration_seconds", "카탈로그 갱신 시간", ["result"], buckets=_LATENCY_BUCKETS
+)
+CATALOG_AGE_SECONDS = Gauge("catalog_age_seconds", "마지막 카탈로그 갱신 성공 후 경과 시간")
+CATALOG_ITEMS = Gauge("catalog_items", "카탈로그 식재료 수")
+
+# 요청별 단계 소요 시간 (Server-Timing 헤더용), 요청 밖에서는 None
+_request_timings = ContextVar("request_timings", default=None)
+
+_listener = None
+
+
+def setup_logging():
+    """로그 기록은 큐에 넣기만 하고 실제 출력은 별도 스레드에서 처리 (요청 경로에서 stdout I/O 제거)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(QueueHandler(log_queue))
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def stage(name: str, histogram: Histogram = None, **labels):
+    """블록 소요 시간을 히스토그램에 기록하고, 요청 중이면 Server-Timing 항목으로도 남김."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if histogram is not None:
+            (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def record_llm_usage(endpoint: str, usage):
+    if usage is not None:
+        LLM_TOKENS.labels(endpoint, "prompt").inc(usage.prompt_tokens or 0)
+        LLM_TOKENS.labels(endpoint, "completion").inc(usage.completion_tokens or 0)
+
+
+class TimingMiddleware:
+    """요청 처리 시간을 경로별 히스토그램에 기록하고, TIMING_HEADERS가 켜져 있으면 Server-Timing 헤더를 붙임.
+
+    경로 라벨은 paths에 등록된 경로만 쓰고 나머지는 "other"로 묶어 라벨 수를 제한한다.
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        timings = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if TIMING_HEADERS:
+                    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+                    entries.append(f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", ", ".join(entries).encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            REQUEST_SECONDS.labels(path, str(status)).observe(time.perf_counter() - started)
+            _request_timings.reset(token)
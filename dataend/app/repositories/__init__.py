@@ -1 +1 @@
-from .ingredient_repo import get_all_ingredients
\ No newline at end of file
+from .ingredient_repo import get_catalog, catalog_manager, IngredientCatalog, Ingredient
\ No newline at end of file
@@ -1,26 +1,202 @@
-import pandas as pd
+import os
 import time
-from db import engine
-
-_cached_df = None
-_last_loaded = 0
-CACHE_TTL = 60
-
-def get_all_ingredients():
-    global _cached_df, _last_loaded
-    now = time.time()
-
-    if _cached_df is None or now - _last_loaded > CACHE_TTL:
-        query = """
-            SELECT i.id as ingredientId,
-                i.name as ingredientName,
-                i.updatedAt,
-                c.id as categoryId,
-                c.name as categoryName
-            FROM ingredients i
-            JOIN categories c ON i.categoryId = c.id
-        """
-        _cached_df = pd.read_sql(query, engine)
-        _last_loaded = now
-
-    return _cached_df
+import asyncio
+import hashlib
+import logging
+from collections import namedtuple
+from functools import reduce
+from operator import xor
+from types import MappingProxyType
+from db import fetch_all_ingredients, fetch_ingredients_since, fetch_catalog_checksum
+from observability import CATALOG_REFRESH_SECONDS, CATALOG_AGE_SECONDS, CATALOG_ITEMS
+
+CATALOG_REFRESH_INTERVAL = int(os.getenv("CATALOG_REFRESH_INTERVAL", 60))
+# updatedAt이 바뀌지 않는 변경(분류명 수정 등)을 놓치지 않도록 N번에 한 번은 전체 재적재
+CATALOG_FULL_RELOAD_EVERY = max(1, int(os.getenv("CATALOG_FULL_RELOAD_EVERY", 60)))
+# 첫 로드 실패 시 재시도 간격, 마지막 갱신 성공 후 이 시간이 지나면 liveness 실패로 봄
+CATALOG_RETRY_INTERVAL = int(os.getenv("CATALOG_RETRY_INTERVAL", 5))
+CATALOG_STALE_AFTER = int(os.getenv("CATALOG_STALE_AFTER", CATALOG_REFRESH_INTERVAL * 5))
+
+logger = logging.getLogger(__name__)
+
+Ingredient = namedtuple("Ingredient", ["ingredientId", "ingredientName", "categoryId", "categoryName"])
+
+
+class IngredientCatalog:
+    """한 번 로드된 카탈로그의 읽기 전용 스냅샷.
+
+    이름/ID로 O(1) 조회하며, 갱신 시에는 새 스냅샷을 만들어 통째로 교체한다.
+    """
+
+    __slots__ = ("by_name", "by_id", "candidate_names", "category_names", "version")
+
+    def __init__(self, records):
+        by_name = {}
+        by_id = {}
+        for record in records:
+            # 동일 이름은 첫 번째 행 기준 (기존 iloc[0]과 동일)
+            by_name.setdefault(record.ingredientName, record)
+            by_id.setdefault(record.ingredientId, record)
+
+        self.by_name = MappingProxyType(by_name)
+        self.by_id = MappingProxyType(by_id)
+        self.candidate_names = tuple(by_name)
+        self.category_names = tuple(sorted({r.categoryName for r in by_name.values()}))
+        self.version = hashlib.sha1(
+            "\n".join(sorted(f"{r.ingredientId}|{r.ingredientName}|{r.categoryId}|{r.categoryName}"
+                             for r in by_name.values())).encode("utf-8")
+        ).hexdigest()
+
+    def __len__(self):
+        return len(self.by_name)
+
+
+class CatalogManager:
+    """프로세스당 하나의 카탈로그 갱신기.
+
+    처음에는 전체를 읽고, 이후에는 updatedAt 워터마크 이후 행만 가져온다.
+    삭제는 ID 집합 체크섬(COUNT, BIT_XOR)으로 감지해 전체 재적재로 처리하며,
+    바뀐 경우에만 새 스냅샷을 만들어 구독자에게 알린다.
+    갱신 루프는 FastAPI lifespan에서 start()/stop()으로 관리한다.
+    """
+
+    def __init__(self, interval_seconds=CATALOG_REFRESH_INTERVAL):
+        self.interval_seconds = interval_seconds
+        self.catalog = None
+        self.generation = 0
+        self.last_refreshed_at = None
+        self.last_error = None
+
+        self._records = {}
+        self._watermark = None
+        self._cycles = 0
+        self._subscribers = []
+        self._lock = asyncio.Lock()
+        self._task = None
+        CATALOG_AGE_SECONDS.set_function(
+            lambda: time.time() - self.last_refreshed_at if self.last_refreshed_at is not None else float("nan")
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.catalog is not None
+
+    def subscribe(self, callback):
+        # callback(catalog): 새 스냅샷이 게시될 때마다 호출
+        self._subscribers.append(callback)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def health(self) -> dict:
+        age = time.time() - self.last_refreshed_at if self.last_refreshed_at is not None else None
+        return {
+            "ready": self.ready,
+            "live": self._task is not None and not self._task.done()
+                    and (age is None or age < CATALOG_STALE_AFTER),
+            "catalogItems": len(self.catalog) if self.catalog is not None else 0,
+            "catalogVersion": self.catalog.version if self.catalog is not None else None,
+            "catalogAgeSeconds": round(age, 1) if age is not None else None,
+            "lastError": self.last_error
+        }
+
+    async def refresh(self):
+        async with self._lock:
+            full = self.catalog is None or self._cycles % CATALOG_FULL_RELOAD_EVERY == 0
+            self._cycles += 1
+
+            if full:
+                changed = await self._load_full()
+            else:
+                changed = await self._load_delta()
+                if not await self._checksum_matches():
+                    logger.warning("catalog checksum mismatch, reloading full catalog")
+                    changed = await self._load_full() or changed
+
+            self.last_refreshed_at = time.time()
+            self.last_error = None
+
+            if not changed:
+                return False
+
+            self.catalog = IngredientCatalog(
+                Ingredient(r.ingredientId, r.ingredientName, r.categoryId, r.categoryName)
+                for r in sorted(self._records.values(), key=lambda r: r.ingredientId)
+            )
+            self.generation += 1
+            catalog = self.catalog
+            CATALOG_ITEMS.set(len(catalog))
+
+        for callback in self._subscribers:
+            try:
+                # 구독자는 동기 함수(SQLite 캐시 갱신 등)이므로 스레드에서 실행
+                await asyncio.to_thread(callback, catalog)
+            except Exception as e:
+                logger.exception("Catalog subscriber failed: %s", e)
+        return True
+
+    async def _load_full(self):
+        rows = await fetch_all_ingredients()
+        records = {row.ingredientId: row for row in rows}
+        changed = self._snapshot_keys(records) != self._snapshot_keys(self._records)
+        self._records = records
+        self._watermark = max((row.updatedAt for row in rows), default=None)
+        return changed
+
+    async def _load_delta(self):
+        if self._watermark is None:
+            return await self._load_full()
+
+        # 같은 시각에 갱신된 행을 놓치지 않도록 >= 로 조회하고, 실제로 달라진 행만 반영
+        rows = await fetch_ingredients_since(self._watermark)
+        changed = False
+        for row in rows:
+            old = self._records.get(row.ingredientId)
+            if old is None or tuple(old) != tuple(row):
+                self._records[row.ingredientId] = row
+                changed = True
+            if row.updatedAt > self._watermark:
+                self._watermark = row.updatedAt
+        return changed
+
+    async def _checksum_matches(self):
+        row = await fetch_catalog_checksum()
+        id_xor = reduce(xor, self._records, 0)
+        return row.cnt == len(self._records) and int(row.idXor) == id_xor
+
+    @staticmethod
+    def _snapshot_keys(records):
+        return {(r.ingredientId, r.ingredientName, r.categoryId, r.categoryName) for r in records.values()}
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            try:
+                changed = await self.refresh()
+                elapsed = time.perf_counter() - started
+                CATALOG_REFRESH_SECONDS.labels("changed" if changed else "unchanged").observe(elapsed)
+                if changed:
+                    logger.info("catalog refreshed (%d items, %.2fs)", len(self.catalog), elapsed)
+            except Exception as e:
+                CATALOG_REFRESH_SECONDS.labels("error").observe(time.perf_counter() - started)
+                self.last_error = str(e)
+                logger.error("Failed to refresh catalog: %s", e)
+            await asyncio.sleep(self.interval_seconds if self.ready else CATALOG_RETRY_INTERVAL)
+
+
+catalog_manager = CatalogManager()
+
+
+def get_catalog() -> IngredientCatalog:
+    # 아직 첫 로드 전이면 None
+    return catalog_manager.catalog
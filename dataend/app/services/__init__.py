@@ -1,2 +1,2 @@
-from .search_ingredients import search_es, remap_wrapper, ask_openai_for_remap
-from .detect_ingredients import ask_openai_for_detect
\ No newline at end of file
+from .search_ingredients import search_es, search_es_batch, remap_wrapper, remap_batch_wrapper, iter_remap_results, ask_openai_for_remap
+from .detect_ingredients import ask_openai_for_detect, detect_ingredients_batch
\ No newline at end of file
@@ -1,37 +1,71 @@
-from openai import OpenAI
-from repositories import get_all_ingredients
+from repositories import catalog_manager
+from .search_ingredients import search_es_batch, remap_batch_wrapper
+from .llm_client import chat_completion
+from .image_preprocess import preprocess_image
+from .single_flight import SingleFlight
+from observability import stage, DETECT_CACHE, DETECT_PAYLOAD_BYTES
 
 import json
 import os
-import base64
-import threading
 import time
+import asyncio
+import logging
+from collections import OrderedDict
 
 INDEX_NAME = "products"
+DETECT_CACHE_TTL = int(os.getenv("DETECT_CACHE_TTL", 60 * 60))
+DETECT_CACHE_SIZE = int(os.getenv("DETECT_CACHE_SIZE", 1000))
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-df = get_all_ingredients()
+logger = logging.getLogger(__name__)
 
-def refresh_df_periodically(interval_seconds=60):
-    global df
-    while True:
-        try:
-            df = get_all_ingredients()
-            print(f"df refreshed at {time.strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
-        except Exception as e:
-            print(f"Failed to refresh df: {e}",  flush=True)
-        time.sleep(interval_seconds)
+# (이미지 내용 해시, 카탈로그 버전) -> (만료 시각, 인식 결과)
+_detect_cache = OrderedDict()
+# 같은 이미지가 동시에 올라오면 인식은 한 번만 수행하고 결과를 공유
+detect_flight = SingleFlight()
 
-threading.Thread(target=refresh_df_periodically, args=(60,), daemon=True).start()
+def _get_cached(key):
+    entry = _detect_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, results = entry
+    if expires_at <= time.time():
+        del _detect_cache[key]
+        return None
+    _detect_cache.move_to_end(key)
+    return [dict(r) for r in results]
 
-def ask_openai_for_detect(image_bytes: bytes) -> list[dict]:
-    global df   
-    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-    candidate_names = df["ingredientName"].drop_duplicates().tolist()
-    candidates_str = ", ".join(candidate_names)
+def _set_cached(key, results):
+    _detect_cache[key] = (time.time() + DETECT_CACHE_TTL, results)
+    _detect_cache.move_to_end(key)
+    while len(_detect_cache) > DETECT_CACHE_SIZE:
+        _detect_cache.popitem(last=False)
+
+async def ask_openai_for_detect(image_path: str, image_hash: str) -> list[dict]:
+    # image_path: 임시 파일로 받은 업로드, image_hash: 업로드 내용의 SHA-256
+    snapshot = catalog_manager.catalog  # 요청 처리 중 카탈로그가 교체되어도 같은 스냅샷을 사용
+
+    # 같은 이미지가 다시 올라오면 이전 인식 결과를 재사용
+    cache_key = (image_hash, snapshot.version)
+    cached = _get_cached(cache_key)
+    DETECT_CACHE.labels("hit" if cached is not None else "miss").inc()
+    if cached is not None:
+        return cached
+
+    results = await detect_flight.do(cache_key, lambda: _detect(image_path, snapshot, cache_key))
+    return [dict(r) for r in results]
+
+async def _detect(image_path: str, snapshot, cache_key) -> list[dict]:
+    # 형식이 잘못된 이미지는 ValueError로 호출자에게 전달
+    with stage("preprocess"):
+        image_url = await preprocess_image(image_path)
+    DETECT_PAYLOAD_BYTES.observe(len(image_url))
+    # 전체 식재료명 대신 분류 목록만 전달해 카탈로그가 커져도 프롬프트 크기가 일정하도록 하고,
+    # 모델이 답한 이름은 카탈로그에 그대로 있으면 바로 쓰고, 아니면 /search와 같은 ES 후보 + LLM 확인으로 매핑
+    categories_str = ", ".join(snapshot.category_names)
 
     try:
-        response = client.chat.completions.create(
+        response = await chat_completion(
+            "detect",
             model="gpt-4o",
             messages=[
                 {
@@ -40,17 +74,17 @@ def ask_openai_for_detect(image_bytes: bytes) -> list[dict]:
                         {
                             "type": "text",
                             "text": (
-                                f"아래 목록 중 이미지에 포함된 식재료를 모두 골라서, "
+                                f"이미지에 포함된 식재료를 모두 찾아 일반적인 식재료명과 아래 분류 목록 중 해당하는 분류를 골라서, "
                                 f"반드시 코드블록 없이 순수 JSON 배열 형태로 반환하세요. "
                                 f"각 항목은 반드시 큰따옴표를 사용하는 JSON 객체이고, "
                                 f"형태는 다음과 같습니다:\n"
-                                f'[{{"ingredientName": "토마토"}}, {{"ingredientName": "감자"}}]\n\n'
-                                f"목록: {candidates_str}"
+                                f'[{{"ingredientName": "토마토", "categoryName": "채소"}}, {{"ingredientName": "감자", "categoryName": "채소"}}]\n\n'
+                                f"분류 목록: {categories_str}"
                             )
                         },
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/png;base64,{image_b64}"}
+                            "image_url": {"url": image_url}
                         }
                     ]
                 }
@@ -59,24 +93,85 @@ def ask_openai_for_detect(image_bytes: bytes) -> list[dict]:
         )
 
         content = response.choices[0].message.content.strip()
-        print("Raw OpenAI response content:", repr(content))
+        logger.debug("Raw OpenAI response content: %r", content)
         parsed = json.loads(content)
 
+        detected = list(dict.fromkeys(
+            name for name in (item.get("ingredientName", "").strip() for item in parsed) if name
+        ))
+        mapped, complete = await _map_detected_names(snapshot, detected)
+
         results = []
-        
-        for item in parsed:
-            name = item.get("ingredientName", "").strip()
-            if name in df["ingredientName"].values:
-                row = df[df["ingredientName"] == name].iloc[0]
-                results.append({
-                    "ingredientId": int(row["ingredientId"]),
-                    "ingredientName": row["ingredientName"],
-                    "categoryId": int(row["categoryId"]),
-                    "categoryName": row["categoryName"]
-                })
+        seen = set()
+        for detected_name in detected:
+            name = mapped.get(detected_name)
+            if name is None:
+                logger.info("인식한 식재료를 카탈로그에 매핑하지 못해 제외: %s", detected_name)
+            elif name not in seen:
+                seen.add(name)
+                results.append(snapshot.by_name[name]._asdict())
+
+        # 매핑 단계가 실패했으면 일부만 담긴 결과이므로 캐시하지 않음
+        if complete:
+            _set_cached(cache_key, results)
         return results
 
     except Exception as e:
-        print("OpenAI 호출 오류:", e)
+        logger.error("OpenAI 호출 오류: %s", e)
         return []
-    
\ No newline at end of file
+    
+async def _map_detected_names(snapshot, names: list[str]) -> tuple[dict, bool]:
+    # 인식한 이름 -> 카탈로그 식재료명 ('제외'/미매핑은 빠짐), 매핑 단계 성공 여부
+    mapped = {name: name for name in names if name in snapshot.by_name}
+    unresolved = [name for name in names if name not in mapped]
+    if not unresolved:
+        return mapped, True
+
+    try:
+        with stage("detect_remap"):
+            es_results = await search_es_batch(unresolved, INDEX_NAME)
+            remapped = await remap_batch_wrapper(es_results)
+    except Exception as e:
+        logger.error("인식 결과 매핑 실패 (%d건): %s", len(unresolved), e)
+        return mapped, False
+
+    for result in remapped:
+        if result["ingredientId"] > 0 and result["ingredientName"] in snapshot.by_name:
+            mapped[result["input_name"]] = result["ingredientName"]
+    return mapped, True
+
+async def detect_ingredients_batch(images: list[tuple[str, str]]) -> dict:
+    # images: (임시 파일 경로, 내용 해시) 목록. 같은 이미지는 한 번만 인식하고 나머지는 동시에 처리
+    snapshot = catalog_manager.catalog
+    unique = {}
+    for image_path, image_hash in images:
+        unique.setdefault(image_hash, image_path)
+
+    outcomes = await asyncio.gather(
+        *[ask_openai_for_detect(image_path, image_hash) for image_hash, image_path in unique.items()],
+        return_exceptions=True
+    )
+    by_hash = dict(zip(unique, outcomes))
+
+    per_image = []
+    merged = {}
+    for i, (_, image_hash) in enumerate(images):
+        outcome = by_hash[image_hash]
+        if isinstance(outcome, ValueError):
+            per_image.append({"index": i, "results": [], "error": str(outcome)})
+            continue
+        if isinstance(outcome, Exception):
+            # 한 이미지의 실패가 배치 전체를 실패시키지 않도록 해당 이미지만 오류로 기록
+            logger.error("이미지 인식 실패 (index=%d): %r", i, outcome)
+            per_image.append({"index": i, "results": [], "error": "이미지를 처리하지 못했습니다"})
+            continue
+        if isinstance(outcome, BaseException):
+            raise outcome
+
+        per_image.append({"index": i, "results": [dict(r) for r in outcome]})
+        for result in outcome:
+            # 여러 이미지에서 나온 같은 식재료는 카탈로그 ID 기준으로 하나로 합침
+            record = snapshot.by_id.get(result["ingredientId"])
+            merged.setdefault(result["ingredientId"], record._asdict() if record is not None else result)
+
+    return {"images": per_image, "merged": list(merged.values())}
@@ -0,0 +1,90 @@
+from PIL import Image, ImageOps, UnidentifiedImageError
+from concurrent.futures import ProcessPoolExecutor
+
+import os
+import base64
+import asyncio
+
+DETECT_MAX_EDGE = int(os.getenv("DETECT_MAX_EDGE", 1024))
+DETECT_IMAGE_FORMAT = os.getenv("DETECT_IMAGE_FORMAT", "JPEG").upper()  # JPEG | WEBP
+DETECT_IMAGE_QUALITY = int(os.getenv("DETECT_IMAGE_QUALITY", 85))
+DETECT_PREPROCESS_WORKERS = int(os.getenv("DETECT_PREPROCESS_WORKERS", 2))
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=DETECT_PREPROCESS_WORKERS)
+    return _executor
+
+
+def _preprocess(image_path: str, max_edge: int, image_format: str, quality: int) -> str:
+    # 프로세스 풀에서 실행: 회전 보정 후 EXIF 제거, 긴 변 기준 축소, JPEG/WebP 재인코딩
+    # 파일에서 바로 디코딩하고 축소된 결과만 base64 data URL로 만들어 돌려줌
+    # 잘린 파일 등 디코딩 실패(OSError)와 픽셀 수 제한 초과(DecompressionBombError)도 ValueError로 전달
+    try:
+        img = Image.open(image_path)
+    except UnidentifiedImageError as e:
+        raise ValueError("지원하지 않는 이미지 형식입니다") from e
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError("손상되었거나 너무 큰 이미지입니다") from e
+
+    with img:
+        try:
+            if img.format == "JPEG":
+                # JPEG은 디코딩 단계에서 축소해 메모리/시간 절약
+                img.draft("RGB", (max_edge, max_edge))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        except (OSError, Image.DecompressionBombError) as e:
+            raise ValueError("손상되었거나 너무 큰 이미지입니다") from e
+
+        out = bytearray(f"data:{MEDIA_TYPES[image_format]};base64,".encode("ascii"))
+        # exif 인자를 넘기지 않으므로 메타데이터는 저장되지 않음
+        with _BufferWriter(out) as writer:
+            img.save(writer, format=image_format, quality=quality, optimize=True)
+        return out.decode("ascii")
+
+
+class _BufferWriter:
+    # 저장되는 바이트를 3바이트 단위로 끊어 바로 base64로 이어 붙임 (원본/인코딩본 이중 보관 방지)
+    def __init__(self, out: bytearray):
+        self._out = out
+        self._pending = b""
+        self._written = 0
+
+    def write(self, data):
+        size = len(data)
+        data = self._pending + bytes(data)
+        cut = len(data) - len(data) % 3
+        self._out += base64.b64encode(data[:cut])
+        self._pending = data[cut:]
+        self._written += size
+        return size
+
+    def tell(self):
+        return self._written
+
+    def flush(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pending:
+            self._out += base64.b64encode(self._pending)
+            self._pending = b""
+
+
+async def preprocess_image(image_path: str) -> str:
+    """업로드 이미지를 모델 전송용으로 축소/재인코딩해 data URL로 반환."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), _preprocess, image_path, DETECT_MAX_EDGE, DETECT_IMAGE_FORMAT, DETECT_IMAGE_QUALITY
+    )
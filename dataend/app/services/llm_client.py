@@ -0,0 +1,89 @@
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, APIStatusError, APIConnectionError
+from observability import stage, record_llm_usage, LLM_REQUEST_SECONDS, LLM_RETRIES
+
+import os
+import httpx
+import time
+import random
+import logging
+import asyncio
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+
+# 전체 동시 호출 수와 엔드포인트별 할당량
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+LLM_ENDPOINT_CONCURRENCY = {
+    "remap": int(os.getenv("LLM_REMAP_CONCURRENCY", 24)),
+    "detect": int(os.getenv("LLM_DETECT_CONCURRENCY", 8)),
+}
+
+logger = logging.getLogger(__name__)
+
+# 재시도는 아래 chat_completion에서 직접 처리하므로 SDK 재시도는 끔
+client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    timeout=LLM_TIMEOUT,
+    max_retries=0,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONCURRENCY,
+            max_keepalive_connections=LLM_MAX_CONCURRENCY
+        )
+    )
+)
+
+_global_limit = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+_endpoint_limits = {name: asyncio.Semaphore(limit) for name, limit in LLM_ENDPOINT_CONCURRENCY.items()}
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return isinstance(e, APIConnectionError)  # 타임아웃 포함
+
+
+def _backoff_delay(e: Exception, attempt: int) -> float:
+    # Retry-After가 있으면 따르고, 없으면 full jitter 지수 백오프
+    if isinstance(e, APIStatusError):
+        retry_after = e.response.headers.get("retry-after")
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+async def chat_completion(endpoint: str, **kwargs):
+    """공용 비동기 클라이언트로 chat completion 호출.
+
+    전체/엔드포인트별 동시 호출 수를 제한하고, 429/5xx/연결 오류는 백오프 후 재시도한다.
+    백오프 대기 중에는 슬롯을 반납한다.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with stage(f"llm_{endpoint}"):
+            response = await _create_with_retries(endpoint, **kwargs)
+        outcome = "ok"
+        record_llm_usage(endpoint, getattr(response, "usage", None))
+        return response
+    finally:
+        LLM_REQUEST_SECONDS.labels(endpoint, outcome).observe(time.perf_counter() - started)
+
+
+async def _create_with_retries(endpoint: str, **kwargs):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            # 엔드포인트 할당량을 먼저 잡아야 한도에 걸린 엔드포인트가 전체 슬롯을 점유한 채 기다리지 않음
+            async with _endpoint_limits[endpoint], _global_limit:
+                return await client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if attempt == LLM_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _backoff_delay(e, attempt)
+            LLM_RETRIES.labels(endpoint).inc()
+            logger.warning("OpenAI %s call failed (%s), retrying in %.2fs", endpoint, e.__class__.__name__, delay)
+            await asyncio.sleep(delay)
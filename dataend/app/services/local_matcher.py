@@ -0,0 +1,128 @@
+from es_profiles import ANALYSIS_PROFILE, PROFILES, decompose_jamo, to_document
+
+import threading
+import numpy as np
+
+# build_query와 같은 필드별 가중치
+EXACT_BOOST = 10
+NOSPACE_BOOST = 5
+EDGE_BOOST = 3
+FUZZY_BOOST = 2
+JAMO_BOOST = 2
+
+
+def _bigrams(text: str) -> list[str]:
+    if len(text) < 2:
+        return [text] if text else []
+    return list({text[i:i + 2] for i in range(len(text) - 1)})
+
+
+class _GramIndex:
+    """bigram -> 문자열 번호 역색인. 게시 목록을 CSR 형태의 numpy 배열(indptr, postings)로 보관."""
+
+    def __init__(self, texts):
+        self.vocab = {}
+        gram_ids = []
+        doc_ids = []
+        self.sizes = np.zeros(len(texts), dtype=np.float32)
+
+        for i, text in enumerate(texts):
+            grams = _bigrams(text)
+            self.sizes[i] = len(grams)
+            for gram in grams:
+                gram_ids.append(self.vocab.setdefault(gram, len(self.vocab)))
+                doc_ids.append(i)
+
+        gram_ids = np.asarray(gram_ids, dtype=np.int32)
+        self.postings = np.asarray(doc_ids, dtype=np.int32)[np.argsort(gram_ids, kind="stable")]
+        self.indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_ids, minlength=len(self.vocab)), out=self.indptr[1:])
+
+    def dice(self, queries: list[str]) -> np.ndarray:
+        # (질의 수, 문자열 수) Dice 계수 행렬. 모든 질의의 게시 목록을 이어 붙여 bincount 한 번으로 겹침 수 계산
+        size = len(self.sizes)
+        query_sizes = np.zeros(len(queries), dtype=np.float32)
+        parts = []
+        for q, text in enumerate(queries):
+            grams = _bigrams(text)
+            query_sizes[q] = len(grams)
+            for gram in grams:
+                gram_id = self.vocab.get(gram)
+                if gram_id is not None:
+                    parts.append(self.postings[self.indptr[gram_id]:self.indptr[gram_id + 1]] + q * size)
+
+        overlap = np.bincount(
+            np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64), minlength=len(queries) * size
+        ).reshape(len(queries), size).astype(np.float32)
+        denominator = query_sizes[:, None] + self.sizes[None, :]
+        return np.divide(2 * overlap, denominator, out=np.zeros_like(overlap), where=denominator > 0)
+
+
+class LocalMatcher:
+    """카탈로그 스냅샷으로 만든 프로세스 내 식재료명 매처 (ES 없이 search_es와 같은 형태의 hit 반환).
+
+    build_query의 각 절을 다음처럼 근사한다.
+    keyword 정확 일치(10) / 공백 제거 bigram 유사도(5) / 접두어 일치(3) / 자모 bigram 유사도로 오타 허용(2),
+    jamo 필드가 있는 프로필이면 자모 유사도(2)를 한 번 더 더한다.
+    """
+
+    def __init__(self, catalog, profile=ANALYSIS_PROFILE):
+        self.names = catalog.candidate_names
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        nospace = [name.replace(" ", "").lower() for name in self.names]
+        self._nospace = np.array(nospace, dtype=str)
+        self._ngrams = _GramIndex(nospace)
+        self._jamo = _GramIndex([decompose_jamo(name) for name in nospace])
+        self._jamo_field = "ingredientName_jamo" in PROFILES[profile]["mappings"]["properties"]
+        self._sources = [
+            to_document({
+                "ingredientId": record.ingredientId,
+                "ingredientName": record.ingredientName,
+                "categoryId": record.categoryId,
+                "categoryName": record.categoryName
+            }, profile)
+            for record in (catalog.by_name[name] for name in self.names)
+        ]
+
+    def score(self, names: list[str]) -> np.ndarray:
+        # (입력 수, 카탈로그 수) 점수 행렬
+        queries = [name.replace(" ", "").lower() for name in names]
+        jamo = self._jamo.dice([decompose_jamo(query) for query in queries])
+        scores = NOSPACE_BOOST * self._ngrams.dice(queries) + (FUZZY_BOOST + (JAMO_BOOST if self._jamo_field else 0)) * jamo
+
+        for q, (name, query) in enumerate(zip(names, queries)):
+            if query:
+                scores[q] += EDGE_BOOST * np.char.startswith(self._nospace, query)
+            exact = self._positions.get(name.strip())
+            if exact is not None:
+                scores[q, exact] += EXACT_BOOST
+
+        return scores
+
+    def search_batch(self, names: list[str], size: int) -> list[list[dict]]:
+        """여러 입력을 한 번에 채점해 입력별 상위 size개를 ES hit 형태({"_source", "_score"})로 반환."""
+        if not self.names or not names:
+            return [[] for _ in names]
+
+        k = min(size, len(self.names))
+        results = []
+        for row in self.score(names):
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top], kind="stable")]
+            results.append([{"_source": self._sources[i], "_score": float(row[i])} for i in top if row[i] > 0])
+        return results
+
+
+_lock = threading.Lock()
+_matcher_catalog = None
+_matcher = None
+
+
+def get_matcher(catalog) -> LocalMatcher:
+    # 같은 카탈로그 스냅샷인 동안에는 재사용
+    global _matcher_catalog, _matcher
+    with _lock:
+        if _matcher is None or _matcher_catalog is not catalog:
+            _matcher = LocalMatcher(catalog)
+            _matcher_catalog = catalog
+        return _matcher
@@ -0,0 +1,263 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+CACHE_PATH = os.getenv("REMAP_CACHE_PATH", "remap_cache.sqlite3")
+CACHE_TTL = int(os.getenv("REMAP_CACHE_TTL", 60 * 60 * 24 * 7))
+CACHE_MAX_SIZE = int(os.getenv("REMAP_CACHE_MAX_SIZE", 50000))
+MEMORY_MAX_SIZE = int(os.getenv("REMAP_CACHE_MEMORY_SIZE", 5000))
+# 다른 워커가 쓰기 잠금을 잡고 있을 때 기다리는 최대 시간(초). 넘으면 캐시 미스/쓰기 생략으로 처리
+CACHE_BUSY_TIMEOUT = float(os.getenv("REMAP_CACHE_BUSY_TIMEOUT", 1))
+
+logger = logging.getLogger(__name__)
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    # 전각/반각, 공백, 대소문자 차이를 같은 키로 취급
+    name = unicodedata.normalize("NFKC", name)
+    return _SPACES.sub(" ", name).strip().lower()
+
+
+def catalog_fingerprints(catalog) -> dict:
+    # ingredientName -> 레코드 지문
+    return {
+        name: f"{record.ingredientId}|{record.categoryId}|{record.categoryName}"
+        for name, record in catalog.by_name.items()
+    }
+
+
+def _changed_names(previous: dict, current: dict) -> set:
+    return {name for name in previous.keys() | current.keys() if previous.get(name) != current.get(name)}
+
+
+class RemapCache:
+    """(정규화된 입력명, ES top hit) -> remap 결과 캐시.
+
+    메모리 LRU 앞단 + SQLite 영속 저장소로 구성되며, 카탈로그가 바뀌면
+    변경된 식재료명과 관련된 항목만 무효화한다.
+    SQLite 파일은 여러 워커가 공유하므로, 다른 워커가 먼저 공유 지문 테이블을 갱신했더라도
+    이 프로세스가 마지막으로 본 지문과도 비교해 자기 메모리 항목을 함께 무효화한다.
+
+    메모리 조회는 호출한 이벤트 루프에서 바로 하고, SQLite 조회/쓰기는 요청당 한 번 스레드에서 묶어 처리한다.
+    SQLite 오류(잠금 대기 초과 등)는 캐시 미스/쓰기 생략으로 처리해 요청을 실패시키지 않는다.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE, memory_size=MEMORY_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.catalog_version = None
+
+        # 이 프로세스가 마지막으로 적용한 카탈로그 지문 (공유 테이블과 별도)
+        self._fingerprints = None
+        self._memory = OrderedDict()
+        # 메모리 LRU와 SQLite 연결은 따로 잠가, 카탈로그 갱신 트랜잭션 중에도 메모리 조회는 막히지 않도록 함
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        # SQLite에서 조회된 키 -> 조회 시각. last_used는 조회마다 쓰지 않고 다음 쓰기 때 함께 갱신
+        self._touched = {}
+        self._writes = 0
+
+        self._conn = sqlite3.connect(path, timeout=CACHE_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS remap_cache (
+                input_key TEXT NOT NULL,
+                es_top TEXT NOT NULL,
+                catalog_version TEXT NOT NULL,
+                ingredient_name TEXT NOT NULL,
+                result TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (input_key, es_top)
+            );
+            CREATE INDEX IF NOT EXISTS idx_remap_ingredient ON remap_cache (ingredient_name);
+            CREATE INDEX IF NOT EXISTS idx_remap_es_top ON remap_cache (es_top);
+            CREATE INDEX IF NOT EXISTS idx_remap_last_used ON remap_cache (last_used);
+            CREATE TABLE IF NOT EXISTS catalog_fingerprint (
+                ingredient_name TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL
+            );
+        """)
+
+    async def get_many(self, items):
+        # items: [(입력명, ES top hit)] -> 같은 순서의 캐시 결과 (없으면 None)
+        keys = [(normalize_name(name), es_top) for name, es_top in items]
+        now = time.time()
+
+        with self._lock:
+            found = [self._memory_get(key, now) for key in keys]
+
+        missing = [i for i, result in enumerate(found) if result is None]
+        if missing:
+            stored = await asyncio.to_thread(self._load, [keys[i] for i in missing], now)
+            for i, result in zip(missing, stored):
+                found[i] = result
+
+        return [None if result is None else {**result, "input_name": name} for (name, _), result in zip(items, found)]
+
+    async def set_many(self, items):
+        # items: [(입력명, ES top hit, 결과)]. 메모리에는 바로 넣고 SQLite에는 스레드에서 한 트랜잭션으로 기록
+        if not items:
+            return
+        now = time.time()
+        rows = [((normalize_name(name), es_top), result) for name, es_top, result in items]
+
+        with self._lock:
+            for key, result in rows:
+                self._remember(key, now + self.ttl, result)
+
+        await asyncio.to_thread(self._store, rows, now)
+
+    def set_catalog(self, fingerprints: dict):
+        # 이전 카탈로그와 비교해 추가/삭제/변경된 식재료명에 걸린 항목만 삭제
+        version = hashlib.sha1(
+            json.dumps(sorted(fingerprints.items()), ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        if version == self.catalog_version:
+            return
+
+        # 다른 워커가 이미 공유 테이블을 갱신했으면 공유 지문과의 비교로는 변경이 보이지 않음
+        changed = _changed_names(self._fingerprints, fingerprints) if self._fingerprints is not None else set()
+        previous = {}
+        stored = True
+        try:
+            with self._db_lock:
+                previous = dict(self._conn.execute("SELECT ingredient_name, fingerprint FROM catalog_fingerprint"))
+                changed |= _changed_names(previous, fingerprints)
+
+                self._conn.execute("BEGIN")
+                try:
+                    if changed:
+                        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS changed_names (name TEXT PRIMARY KEY)")
+                        self._conn.execute("DELETE FROM changed_names")
+                        self._conn.executemany("INSERT INTO changed_names VALUES (?)", [(n,) for n in changed])
+                        self._conn.execute(
+                            "DELETE FROM remap_cache WHERE ingredient_name IN (SELECT name FROM changed_names) "
+                            "OR es_top IN (SELECT name FROM changed_names)"
+                        )
+                        self._conn.execute("DELETE FROM catalog_fingerprint")
+                        self._conn.executemany("INSERT INTO catalog_fingerprint VALUES (?, ?)", fingerprints.items())
+                    self._conn.execute("UPDATE remap_cache SET catalog_version = ?", (version,))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._rollback()
+                    raise
+        except sqlite3.Error as e:
+            # 저장된 항목은 이전 버전으로 남아 조회되지 않으므로(미스) 안전. 다음 갱신 때 다시 비교됨
+            logger.error("remap cache catalog update failed, stored entries ignored: %s", e)
+            stored = False
+
+        with self._lock:
+            if stored:
+                for key in [k for k, (_, r) in self._memory.items() if r["ingredientName"] in changed or k[1] in changed]:
+                    del self._memory[key]
+            else:
+                # 무엇이 바뀌었는지 공유 테이블로 확인하지 못했으므로 메모리도 비움
+                self._memory.clear()
+            self.catalog_version = version
+            self._fingerprints = dict(fingerprints)
+
+        if changed and previous:
+            logger.info("remap cache invalidated for %d changed ingredients", len(changed))
+
+    def _memory_get(self, key, now):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at > now:
+            self._memory.move_to_end(key)
+            return result
+        del self._memory[key]
+        return None
+
+    def _load(self, keys, now):
+        # 스레드에서 실행: 메모리에 없던 키를 SQLite에서 조회해 메모리에 올림
+        version = self.catalog_version or ""
+        rows = []
+        try:
+            with self._db_lock:
+                for key in keys:
+                    row = self._conn.execute(
+                        "SELECT result, expires_at FROM remap_cache "
+                        "WHERE input_key = ? AND es_top = ? AND catalog_version = ? AND expires_at > ?",
+                        (*key, version, now)
+                    ).fetchone()
+                    if row is not None:
+                        self._touched[key] = now
+                    rows.append(row)
+        except sqlite3.Error as e:
+            logger.warning("remap cache read failed, treating as miss: %s", e)
+            return [None] * len(keys)
+
+        results = []
+        with self._lock:
+            # 조회하는 동안 카탈로그가 바뀌었으면 읽은 항목은 버림
+            if (self.catalog_version or "") != version:
+                return [None] * len(keys)
+            for key, row in zip(keys, rows):
+                result = json.loads(row[0]) if row is not None else None
+                if result is not None:
+                    self._remember(key, row[1], result)
+                results.append(result)
+        return results
+
+    def _store(self, rows, now):
+        # 스레드에서 실행: 새 결과와 모아 둔 last_used 갱신을 한 트랜잭션으로 기록
+        version = self.catalog_version or ""
+        try:
+            with self._db_lock:
+                touched, self._touched = self._touched, {}
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO remap_cache "
+                        "(input_key, es_top, catalog_version, ingredient_name, result, expires_at, last_used) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(*key, version, result["ingredientName"], json.dumps(result, ensure_ascii=False),
+                          now + self.ttl, now) for key, result in rows]
+                    )
+                    self._conn.executemany(
+                        "UPDATE remap_cache SET last_used = ? WHERE input_key = ? AND es_top = ?",
+                        [(used, *key) for key, used in touched.items()]
+                    )
+                    self._writes += len(rows)
+                    if self._writes >= 100:
+                        self._writes = 0
+                        self._evict(now)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._rollback()
+                    raise
+        except sqlite3.Error as e:
+            logger.warning("remap cache write skipped for %d entries: %s", len(rows), e)
+
+    def _rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def _remember(self, key, expires_at, result):
+        self._memory[key] = (expires_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM remap_cache WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM remap_cache WHERE rowid IN ("
+            "SELECT rowid FROM remap_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
@@ -1,59 +1,329 @@
-from openai import OpenAI
 from elasticsearch import AsyncElasticsearch
-from repositories import get_all_ingredients
+from repositories import catalog_manager
+from es_profiles import build_query
+from .remap_cache import RemapCache, catalog_fingerprints, normalize_name
+from .shortlist import SHORTLIST_SIZE, shortlist_candidates
+from .llm_client import chat_completion
+from .single_flight import SingleFlight
+from .local_matcher import get_matcher
+from observability import stage, ES_QUERY_SECONDS, LOCAL_MATCH_SECONDS, MATCHER_FALLBACKS, REMAP_PATHS
 
 import os
 import json
 import asyncio
-import threading
-import time
+import logging
+from collections import Counter
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 es = AsyncElasticsearch("http://elasticsearch:9200")
-df = get_all_ingredients()
+REMAP_BATCH_SIZE = int(os.getenv("REMAP_BATCH_SIZE", 20))
+# ES 결과가 확실하면 LLM을 건너뜀: 정확히 일치하거나, top-1과 top-2의 상대 점수 차가 MARGIN 이상인 경우 (0이면 비활성화)
+# 점수 차만으로는 식재료가 아닌 입력('양파링 과자', '토마토 케첩' 등)의 '제외' 판단까지 건너뛰게 되므로 MARGIN은 기본 비활성화
+REMAP_BYPASS_EXACT = os.getenv("REMAP_BYPASS_EXACT", "true").lower() == "true"
+REMAP_BYPASS_MARGIN = float(os.getenv("REMAP_BYPASS_MARGIN", 0))
+# 로컬 매처 점수는 ES BM25 점수와 분포가 달라 같은 기준을 쓸 수 없으므로 별도로 설정 (0이면 비활성화)
+REMAP_BYPASS_MARGIN_LOCAL = float(os.getenv("REMAP_BYPASS_MARGIN_LOCAL", 0))
+# es: Elasticsearch만 사용, local: 프로세스 내 매처만 사용, es_fallback: ES가 실패하거나 ES_FALLBACK_TIMEOUT을 넘기면 로컬 매처로 대체
+MATCHER_MODE = os.getenv("MATCHER_MODE", "es").lower()
+ES_FALLBACK_TIMEOUT = float(os.getenv("ES_FALLBACK_TIMEOUT", 0.5))
+logger = logging.getLogger(__name__)
+remap_cache = RemapCache()
+# 동시에 들어온 같은 입력(정규화 기준)은 ES 검색과 LLM 매핑을 한 번만 수행하고 결과를 공유
+search_flight = SingleFlight()
+remap_flight = SingleFlight()
 
-def refresh_df_periodically(interval_seconds=60):
-    global df
-    while True:
-        try:
-            df = get_all_ingredients()
-            print(f"df refreshed at {time.strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
-        except Exception as e:
-            print(f"Failed to refresh df: {e}", flush=True)
-        time.sleep(interval_seconds)
+def _on_catalog_refresh(new_catalog):
+    remap_cache.set_catalog(catalog_fingerprints(new_catalog))
 
-threading.Thread(target=refresh_df_periodically, args=(60,), daemon=True).start()
+# 카탈로그 로드/갱신은 main.py의 lifespan에서 시작하는 catalog_manager가 담당
+catalog_manager.subscribe(_on_catalog_refresh)
+if MATCHER_MODE != "es":
+    # 새 스냅샷이 게시될 때 로컬 매처 색인을 미리 만들어 첫 요청이 빌드 시간을 기다리지 않도록 함
+    catalog_manager.subscribe(get_matcher)
 
 async def search_es(name, index_name):
+    return (await search_es_batch([name], index_name))[0]
+
+async def search_es_batch(names, index_name):
+    # 정규화한 이름 기준으로 중복을 합치고, 다른 요청에서 이미 검색 중인 이름은 그 결과를 기다림
+    keys = [normalize_name(name) for name in names]
+    representatives = {}
+    for name, key in zip(names, keys):
+        representatives.setdefault(key, name)
+
+    unique = list(representatives)
+    hits, _ = await search_flight.do_many(
+        [(index_name, key) for key in unique],
+        lambda flight_keys: _search_hits([representatives[key] for _, key in flight_keys], index_name)
+    )
+    by_key = dict(zip(unique, hits))
+
+    # 상위 hit들은 점수/일치 유형과 함께 반환하고, remap 프롬프트의 후보 리스트로도 사용
+    return [(name, by_key[key]) for name, key in zip(names, keys)]
+
+async def _search_one(name, index_name):
     
-    query = {
-            "query": {
-                    "bool": {
-                        "should": [
-                            {"match": {"ingredientName_nospace": {"query": name, "boost": 5}}},
-                            {"match": {"ingredientName.edge": {"query": name, "boost": 3}}},
-                            {"match": {"ingredientName": {"query": name, "boost": 2, "fuzziness": "AUTO"}}}
-                        ]
-                    }
-                },
-            "_source": ["ingredientId", "ingredientName", "categoryName", "categoryId"],
-            "size": 1
-        }
-    
-    res = await es.search(index=index_name, body=query)
-    
-    if res["hits"]["hits"]:
-        return name, res["hits"]["hits"][0]["_source"]["ingredientName"]
+    with stage("es", ES_QUERY_SECONDS, operation="search"):
+        res = await es.search(index=index_name, body=build_query(name, SHORTLIST_SIZE))
     
-    return name, "기타"
+    return _parse_hits(name, res["hits"]["hits"])
+
+async def _search_hits(names, index_name):
+    if MATCHER_MODE == "local":
+        return _local_hits(names)
+
+    if MATCHER_MODE == "es_fallback":
+        try:
+            return await asyncio.wait_for(_es_hits(names, index_name), ES_FALLBACK_TIMEOUT)
+        except Exception as e:
+            MATCHER_FALLBACKS.labels(e.__class__.__name__).inc()
+            logger.warning("ES search failed (%s), using local matcher for %d names", e.__class__.__name__, len(names))
+            return _local_hits(names)
+
+    return await _es_hits(names, index_name)
+
+def _local_hits(names):
+    with stage("local_match", LOCAL_MATCH_SECONDS):
+        raw_hits = get_matcher(catalog_manager.catalog).search_batch(names, SHORTLIST_SIZE)
+    return [_parse_hits(name, hits, matcher="local") for name, hits in zip(names, raw_hits)]
+
+async def _es_hits(names, index_name):
+    # 여러 이름을 _msearch 한 번으로 조회하고, 개별 쿼리가 실패한 이름만 단건 검색으로 재시도
+    if len(names) == 1:
+        return [await _search_one(names[0], index_name)]
+
+    searches = []
+    for name in names:
+        searches.append({"index": index_name})
+        searches.append(build_query(name, SHORTLIST_SIZE))
+
+    with stage("es", ES_QUERY_SECONDS, operation="msearch"):
+        res = await es.msearch(searches=searches)
+
+    results = [None] * len(names)
+    failed = []
+    for i, (name, response) in enumerate(zip(names, res["responses"])):
+        if "error" in response:
+            logger.warning("msearch failed for %s: %s", name, response["error"])
+            failed.append(i)
+        else:
+            results[i] = _parse_hits(name, response["hits"]["hits"])
+
+    retried = await asyncio.gather(*[_search_one(names[i], index_name) for i in failed])
+    for i, result in zip(failed, retried):
+        results[i] = result
+
+    return results
+
+def _parse_hits(name, raw_hits, matcher="es"):
+    key = normalize_name(name)
+    hits = []
+    seen = set()
+
+    for hit in raw_hits:
+        source = hit["_source"]
+        if source["ingredientName"] in seen:
+            continue
+        seen.add(source["ingredientName"])
+
+        if normalize_name(source["ingredientName"]) == key:
+            match_type = "exact"
+        elif normalize_name(source.get("ingredientName_nospace", "")) == key.replace(" ", ""):
+            match_type = "exact_nospace"
+        else:
+            match_type = "partial"
+
+        hits.append({
+            "ingredientName": source["ingredientName"],
+            "ingredientId": source["ingredientId"],
+            "categoryId": source["categoryId"],
+            "categoryName": source["categoryName"],
+            "score": hit["_score"],
+            "matchType": match_type,
+            "matcher": matcher
+        })
+
+    return hits
+
+def top_name(hits) -> str:
+    return hits[0]["ingredientName"] if hits else "기타"
+
+def remap_bypass_path(hits):
+    # LLM을 건너뛸 수 있으면 그 경로 이름을, 아니면 None을 반환
+    if not hits:
+        return None
+
+    if REMAP_BYPASS_EXACT and hits[0]["matchType"] != "partial":
+        return "exact"
+
+    threshold = REMAP_BYPASS_MARGIN_LOCAL if hits[0]["matcher"] == "local" else REMAP_BYPASS_MARGIN
+    if threshold > 0 and len(hits) >= 2 and hits[0]["score"] > 0:
+        margin = (hits[0]["score"] - hits[1]["score"]) / hits[0]["score"]
+        if margin >= threshold:
+            return "margin"
+
+    return None
+
+async def remap_wrapper(name, hits):
+    path = remap_bypass_path(hits)
+    if path is not None:
+        result = _build_remap_result(name, hits[0]["ingredientName"])
+        # ES 색인이 카탈로그보다 앞서 있어 매핑할 수 없으면 LLM 경로로 진행
+        if result["ingredientId"] != 0:
+            REMAP_PATHS.labels(path).inc()
+            return result
+
+    cached = (await remap_cache.get_many([(name, top_name(hits))]))[0]
+    if cached is not None:
+        REMAP_PATHS.labels("cache").inc()
+        return cached
+
+    key = (normalize_name(name), top_name(hits))
+    results, owned = await remap_flight.do_many(
+        [key], lambda keys: _remap_single(name, top_name(hits), [hit["ingredientName"] for hit in hits])
+    )
+    REMAP_PATHS.labels("llm" if key in owned else "coalesced").inc()
+    return {**results[0], "input_name": name}
+
+
+async def _remap_single(name, es_top, candidates):
+    return [await _remap_and_cache(name, es_top, candidates)]
+
+
+async def _remap_and_cache(name, es_top, candidates):
+    result = await ask_openai_for_remap(name, es_top, candidates)
+
+    # '기타'는 호출 실패일 수도 있으므로 캐시하지 않음
+    if result["ingredientId"] != 0:
+        await remap_cache.set_many([(name, es_top, result)])
+
+    return result
+
+
+async def remap_batch_wrapper(es_results):
+    results = [None] * len(es_results)
+    async for i, result, _ in iter_remap_results(es_results):
+        results[i] = result
+    return results
+
+
+async def iter_remap_results(es_results):
+    """(입력 순번, remap 결과, 처리 경로)를 준비되는 대로 생성.
+
+    ES 결과로 확정되거나 캐시에 있는 항목을 먼저 내보내고, LLM 매핑은 REMAP_BATCH_SIZE 단위 요청이 끝나는 순서대로 내보낸다.
+    """
+    paths = Counter()
+    lookups = []
+    misses = []
+
+    for i, (name, hits) in enumerate(es_results):
+        path = remap_bypass_path(hits)
+        if path is not None:
+            result = _build_remap_result(name, hits[0]["ingredientName"])
+            if result["ingredientId"] != 0:
+                paths[path] += 1
+                REMAP_PATHS.labels(path).inc()
+                yield i, result, path
+                continue
+        lookups.append(i)
+
+    # 캐시 조회는 한 번에 묶어서 (메모리에 없는 항목만 스레드에서 SQLite 조회)
+    cached_results = await remap_cache.get_many([(es_results[i][0], top_name(es_results[i][1])) for i in lookups])
+    for i, cached in zip(lookups, cached_results):
+        if cached is not None:
+            paths["cache"] += 1
+            REMAP_PATHS.labels("cache").inc()
+            yield i, cached, "cache"
+        else:
+            misses.append(i)
+
+    # 정규화 이름이 같은 입력은 한 번만 매핑하고, 다른 요청에서 매핑 중인 입력은 그 결과를 기다림
+    groups = {}
+    for i in misses:
+        name, hits = es_results[i]
+        groups.setdefault((normalize_name(name), top_name(hits)), []).append(i)
+
+    remap_inputs = {
+        key: (es_results[indices[0]][0], key[1], [hit["ingredientName"] for hit in es_results[indices[0]][1]])
+        for key, indices in groups.items()
+    }
+    async def remap_chunk(chunk):
+        remapped, owned = await remap_flight.do_many(
+            chunk, lambda owned_keys: _remap_batch_and_cache([remap_inputs[key] for key in owned_keys])
+        )
+        return chunk, remapped, owned
+
+    keys = list(groups)
+    tasks = [
+        asyncio.ensure_future(remap_chunk(keys[i:i + REMAP_BATCH_SIZE]))
+        for i in range(0, len(keys), REMAP_BATCH_SIZE)
+    ]
+    try:
+        for next_chunk in asyncio.as_completed(tasks):
+            chunk, remapped, owned = await next_chunk
+            for key, result in zip(chunk, remapped):
+                for n, i in enumerate(groups[key]):
+                    # 이번 요청이 매핑을 시작한 키의 첫 입력만 "llm", 나머지는 결과를 공유한 것("coalesced")
+                    path = "llm" if n == 0 and key in owned else "coalesced"
+                    paths[path] += 1
+                    REMAP_PATHS.labels(path).inc()
+                    yield i, {**result, "input_name": es_results[i][0]}, path
+    finally:
+        # 소비하는 쪽이 중간에 멈추면(클라이언트 연결 종료 등) 남은 대기만 취소. 매핑 자체는 single-flight 태스크에서 계속됨
+        for task in tasks:
+            task.cancel()
+        logger.debug("remap paths: %s", dict(paths))
+
+
+async def _remap_batch_and_cache(remap_inputs):
+    chunks = [remap_inputs[i:i + REMAP_BATCH_SIZE] for i in range(0, len(remap_inputs), REMAP_BATCH_SIZE)]
+    chunk_results = await asyncio.gather(*[ask_openai_for_remap_batch(chunk) for chunk in chunks])
+
+    results = []
+    cacheable = []
+    for chunk, remapped in zip(chunks, chunk_results):
+        for (name, es_top, _), result in zip(chunk, remapped):
+            if result["ingredientId"] != 0:
+                cacheable.append((name, es_top, result))
+            results.append(result)
+
+    await remap_cache.set_many(cacheable)
+    return results
+
+
+def _excluded_result(input_name: str) -> dict:
+    return {
+        "input_name": input_name,
+        "ingredientId": -1,
+        "ingredientName": "제외",
+        "categoryId": -1,
+        "categoryName": "제외"
+    }
+
+
+def _default_result(input_name: str) -> dict:
+    return {
+        "input_name": input_name,
+        "ingredientId": 0,
+        "ingredientName": "기타",
+        "categoryId": 0,
+        "categoryName": "기타"
+    }
+
 
-async def remap_wrapper(name, top_name):
-    return await ask_openai_for_remap(name, top_name)
+def _build_remap_result(input_name: str, matched_name: str) -> dict:
+    if matched_name == "제외":
+        return _excluded_result(input_name)
 
+    record = catalog_manager.catalog.by_name.get(matched_name)
 
-async def ask_openai_for_remap(input_name: str, es_result: str) -> dict:
-    global df
-    candidate_names = df["ingredientName"].drop_duplicates().tolist()
+    if record is not None:
+        return {"input_name": input_name, **record._asdict()}
+
+    return _default_result(input_name)
+
+
+async def ask_openai_for_remap(input_name: str, es_result: str, es_candidates=()) -> dict:
+    candidate_names = shortlist_candidates(catalog_manager.catalog, input_name, [*es_candidates, es_result])
     system_prompt = f"후보 식재료 리스트:\n{candidate_names}"
     
     user_prompt = (
@@ -65,54 +335,83 @@ async def ask_openai_for_remap(input_name: str, es_result: str) -> dict:
     )
 
     try:
-        response = await asyncio.to_thread(
-            lambda: client.chat.completions.create(
-                model="gpt-4.1-nano",
-                messages=[{"role": "system", "content": system_prompt}, 
-                          {"role": "user", "content": user_prompt}
-                          ],
-                temperature=0.0
-            )
+        response = await chat_completion(
+            "remap",
+            model="gpt-4.1-nano",
+            messages=[{"role": "system", "content": system_prompt}, 
+                      {"role": "user", "content": user_prompt}
+                      ],
+            temperature=0.0
         )
         
         content = response.choices[0].message.content.strip()
         parsed = json.loads(content)
         
-        print(parsed)
-        
         matched_name = parsed.get("ingredientName", "기타").strip()
-        
-        print(matched_name)
-
-        if matched_name == "제외":
-            return {
-                "input_name": input_name,
-                "ingredientId": -1,
-                "ingredientName": "제외",
-                "categoryId": -1,
-                "categoryName": "제외"
-            }
-
-        row = df[df["ingredientName"] == matched_name]
-        
-        if not row.empty:
-            row = row.iloc[0]
-            
-            return {
-                "input_name": input_name,
-                "ingredientId": int(row["ingredientId"]),
-                "ingredientName": row["ingredientName"],
-                "categoryId": int(row["categoryId"]),
-                "categoryName": row["categoryName"]
-            }
+        logger.debug("remap %s -> %s", input_name, matched_name)
+
+        return _build_remap_result(input_name, matched_name)
 
     except Exception as e:
-        print(f"OpenAI remap failed for {input_name}: {e}")
+        logger.error("OpenAI remap failed for %s: %s", input_name, e)
 
-    return {
-        "input_name": input_name,
-        "ingredientId": 0,
-        "ingredientName": "기타",
-        "categoryId": 0,
-        "categoryName": "기타"
-    }
\ No newline at end of file
+    return _default_result(input_name)
+
+
+async def ask_openai_for_remap_batch(es_results: list[tuple[str, str, list[str]]]) -> list[dict]:
+    # 여러 입력을 한 번의 요청으로 매핑하고, 응답에서 빠지거나 파싱되지 않은 항목만 개별 호출로 재시도
+    if len(es_results) == 1:
+        return [await ask_openai_for_remap(*es_results[0])]
+
+    items = [
+        {
+            "index": i,
+            "input": name,
+            "elasticsearch": top_name,
+            "candidates": shortlist_candidates(catalog_manager.catalog, name, [*candidates, top_name])
+        }
+        for i, (name, top_name, candidates) in enumerate(es_results)
+    ]
+    system_prompt = "각 사용자 입력에는 그 입력에 대한 후보 식재료 리스트(candidates)가 함께 주어집니다."
+
+    user_prompt = (
+        f"사용자 입력 목록:\n{json.dumps(items, ensure_ascii=False)}\n\n"
+        f"각 input이 자신의 candidates에 없거나 매핑이 되어 있어도 식재료가 아닌 물건일 경우 '제외'로 처리하고, '기타'이거나 다르게 매핑되어 있는 경우에도 "
+        f"다시 한번 확인해서 candidates 중 가장 적합한 ingredientName을 골라 index와 함께 JSON 형식으로 리턴하세요. 최대한 정확하고 제대로 매핑되도록 판단해주세요.\n"
+        f'예시: {{"results": [{{"index": 0, "ingredientName": "토마토"}}, {{"index": 1, "ingredientName": "제외"}}]}}'
+    )
+
+    matched = {}
+    try:
+        response = await chat_completion(
+            "remap",
+            model="gpt-4.1-nano",
+            messages=[{"role": "system", "content": system_prompt},
+                      {"role": "user", "content": user_prompt}
+                      ],
+            response_format={"type": "json_object"},
+            temperature=0.0
+        )
+
+        content = response.choices[0].message.content.strip()
+        parsed = json.loads(content)
+
+        for item in parsed.get("results", []):
+            index = item.get("index")
+            name = item.get("ingredientName")
+            if isinstance(index, int) and 0 <= index < len(es_results) and isinstance(name, str):
+                matched[index] = name.strip()
+
+    except Exception as e:
+        logger.error("OpenAI batch remap failed for %d items: %s", len(es_results), e)
+
+    missing = [i for i in range(len(es_results)) if i not in matched]
+    if missing:
+        logger.warning("OpenAI batch remap falling back to single calls for %d items", len(missing))
+    fallback = await asyncio.gather(*[ask_openai_for_remap(*es_results[i]) for i in missing])
+    fallback = dict(zip(missing, fallback))
+
+    return [
+        fallback[i] if i in fallback else _build_remap_result(name, matched[i])
+        for i, (name, _, _) in enumerate(es_results)
+    ]
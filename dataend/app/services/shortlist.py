@@ -0,0 +1,75 @@
+from collections import Counter, defaultdict
+
+import os
+import threading
+
+SHORTLIST_SIZE = int(os.getenv("REMAP_SHORTLIST_SIZE", 20))
+
+
+def _grams(text: str) -> set:
+    text = text.replace(" ", "").lower()
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class NgramIndex:
+    """식재료명 bigram 역색인. 프롬프트에 넣을 후보를 전체 카탈로그 대신 top-K로 줄이는 데 사용."""
+
+    def __init__(self, catalog):
+        self.names = catalog.candidate_names
+        self.categories = [catalog.by_name[name].categoryName for name in self.names]
+        self.category_names = catalog.category_names
+
+        self._postings = defaultdict(list)
+        self._sizes = []
+        for i, name in enumerate(self.names):
+            grams = _grams(name)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(i)
+
+    def top_k(self, query: str, k: int = SHORTLIST_SIZE, category: str = None) -> list[tuple[str, float]]:
+        grams = _grams(query)
+        if not grams:
+            return []
+
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self._postings.get(gram, ()))
+
+        scored = []
+        for i, count in overlap.items():
+            if category is not None and self.categories[i] != category:
+                continue
+            # Dice 계수
+            scored.append((2 * count / (len(grams) + self._sizes[i]), self.names[i]))
+
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [(name, score) for score, name in scored[:k]]
+
+
+_lock = threading.Lock()
+_index_catalog = None
+_index = None
+
+
+def get_index(catalog) -> NgramIndex:
+    # 같은 카탈로그 스냅샷인 동안에는 재사용
+    global _index_catalog, _index
+    with _lock:
+        if _index is None or _index_catalog is not catalog:
+            _index = NgramIndex(catalog)
+            _index_catalog = catalog
+        return _index
+
+
+def shortlist_candidates(catalog, name: str, es_candidates: list[str], k: int = SHORTLIST_SIZE) -> list[str]:
+    # ES 상위 결과를 우선하고, 부족한 만큼 로컬 n-gram 후보로 채움
+    candidates = list(dict.fromkeys(es_candidates))[:k]
+    for candidate, _ in get_index(catalog).top_k(name, k):
+        if len(candidates) >= k:
+            break
+        if candidate not in candidates:
+            candidates.append(candidate)
+    return candidates
@@ -0,0 +1,59 @@
+import asyncio
+
+
+class SingleFlight:
+    """같은 키에 대한 동시 작업을 하나로 합치는 요청 병합기.
+
+    이미 진행 중인 키는 새로 계산하지 않고 그 결과를 함께 기다린다.
+    작업이 끝나면(성공/실패 모두) 키를 비우므로 결과를 보관하지는 않는다. 캐시는 별도로 둔다.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        # fn(): 코루틴을 반환하는 함수
+        results, _ = await self.do_many([key], lambda keys: _single(fn))
+        return results[0]
+
+    async def do_many(self, keys, fn):
+        # keys: 중복 없는 키 목록, fn(owned_keys): owned_keys 순서대로 결과 목록을 반환하는 코루틴 함수
+        # 진행 중이 아닌 키만 모아 fn을 한 번 호출하고, 나머지는 먼저 시작된 작업의 결과를 기다림
+        # (keys 순서의 결과 목록, 이번 호출이 직접 계산을 시작한 키 집합)을 반환
+        waiting = {key: self._inflight[key] for key in keys if key in self._inflight}
+        owned = [key for key in keys if key not in waiting]
+
+        if owned:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in owned}
+            self._inflight.update(futures)
+            waiting.update(futures)
+            # 먼저 요청한 쪽이 취소되어도 함께 기다리는 요청에 영향이 없도록 별도 태스크로 실행
+            asyncio.ensure_future(self._run(owned, futures, fn))
+
+        results = await asyncio.gather(*[asyncio.shield(waiting[key]) for key in keys])
+        return list(results), set(owned)
+
+    async def _run(self, keys, futures, fn):
+        try:
+            results = await fn(keys)
+            for key, result in zip(keys, results):
+                futures[key].set_result(result)
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for key, future in futures.items():
+                if not future.done():
+                    future.set_exception(RuntimeError(f"single-flight 결과 없음: {key}"))
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+
+async def _single(fn):
+    return [await fn()]
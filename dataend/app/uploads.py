@@ -0,0 +1,95 @@
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from observability import DETECT_UPLOAD_BYTES
+
+import os
+import asyncio
+import hashlib
+import tempfile
+
+DETECT_MAX_UPLOAD_BYTES = int(os.getenv("DETECT_MAX_UPLOAD_BYTES", 15 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# multipart 경계/헤더 등 파일 외 본문 크기 여유분
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def _too_large(max_bytes):
+    return HTTPException(status_code=413, detail=f"업로드 크기는 {max_bytes // (1024 * 1024)}MB를 넘을 수 없습니다")
+
+
+class UploadLimitMiddleware:
+    """경로별 요청 본문 크기 제한.
+
+    Content-Length가 한도를 넘으면 본문을 읽기 전에 413으로 거절하고,
+    Content-Length가 없는(chunked) 요청은 읽는 도중 한도를 넘는 순간 중단한다.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and int(content_length) > max_bytes:
+            response = JSONResponse({"detail": _too_large(max_bytes).detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise _too_large(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _copy_and_hash(src, dst, max_bytes):
+    # 업로드 원본(upload.file)을 처음부터 읽으며 크기 제한/해시 계산과 임시 파일 쓰기를 한 번에 처리
+    src.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := src.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        digest.update(chunk)
+        dst.write(chunk)
+    return size, digest.hexdigest()
+
+
+@asynccontextmanager
+async def spooled_upload(upload: UploadFile, max_bytes: int = DETECT_MAX_UPLOAD_BYTES):
+    """업로드를 임시 파일로 한 번 옮기며 크기 제한과 SHA-256을 함께 계산.
+
+    (임시 파일 경로, 해시)를 돌려주고, 블록을 벗어나면 파일을 삭제한다.
+    Starlette의 upload.file은 1MB까지는 메모리에, 넘으면 이름 없는 임시 파일에 있어
+    프로세스 풀의 전처리에 넘길 경로가 없으므로 복사는 한 번 필요하다.
+    대신 upload.read()로 청크마다 스레드를 오가지 않고 upload.file을 스레드 한 번에서 바로 읽는다.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    fd, path = tempfile.mkstemp(prefix="detect_", suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            size, image_hash = await asyncio.to_thread(_copy_and_hash, upload.file, f, max_bytes)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="빈 파일입니다")
+        DETECT_UPLOAD_BYTES.observe(size)
+
+        yield path, image_hash
+    finally:
+        os.remove(path)
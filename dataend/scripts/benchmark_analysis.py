@@ -0,0 +1,105 @@
+from elasticsearch.helpers import parallel_bulk
+from es_profiles import PROFILES, build_mapping, build_query
+from sync_to_es import es, iter_mysql_rows, to_source
+
+import csv
+import time
+import argparse
+import statistics
+
+# 분석 프로필별 인덱스 크기 / 쿼리 지연 / top-1 정확도 비교
+# 사용법: python scripts/benchmark_analysis.py --queries labeled.csv [--profiles ngram bigram jamo] [--repeat 3]
+# labeled.csv: input_name,expected (expected는 정답 ingredientName)
+
+
+def load_labeled(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return [(row["input_name"], row["expected"]) for row in csv.DictReader(f)]
+
+
+def build_index(profile, rows):
+    index_name = f"bench_products_{profile}"
+    es.options(ignore_status=[404]).indices.delete(index=index_name)
+
+    body = build_mapping(profile)
+    body["settings"]["index"].update({"number_of_replicas": 0, "refresh_interval": "-1"})
+    es.indices.create(index=index_name, body=body)
+
+    actions = (
+        {"_index": index_name, "_id": str(row["ingredientId"]), "_source": to_source(row, profile)}
+        for row in rows
+    )
+    for ok, item in parallel_bulk(es, actions, raise_on_error=False):
+        if not ok:
+            print(f"[ERROR] {profile} 색인 실패: {item}")
+
+    es.indices.put_settings(index=index_name, settings={"refresh_interval": "1s"})
+    es.indices.refresh(index=index_name)
+    es.indices.forcemerge(index=index_name, max_num_segments=1)
+    return index_name
+
+
+def run_queries(index_name, profile, labeled, repeat):
+    latencies = []
+    correct = 0
+
+    for i in range(repeat):
+        for input_name, expected in labeled:
+            started = time.perf_counter()
+            res = es.search(index=index_name, body=build_query(input_name, 1, profile))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            if i == 0:
+                hits = res["hits"]["hits"]
+                if hits and hits[0]["_source"]["ingredientName"] == expected:
+                    correct += 1
+
+    return latencies, correct / len(labeled) if labeled else 0.0
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Elasticsearch 분석 프로필 벤치마크")
+    parser.add_argument("--queries", required=True, help="input_name,expected 컬럼의 CSV")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="벤치마크 인덱스를 삭제하지 않음")
+    args = parser.parse_args()
+
+    labeled = load_labeled(args.queries)
+    rows = list(iter_mysql_rows())
+    print(f"[INFO] 카탈로그 {len(rows)}건, 평가 입력 {len(labeled)}건")
+
+    report = []
+    for profile in args.profiles:
+        try:
+            index_name = build_index(profile, rows)
+        except Exception as e:
+            # nori 프로필은 analysis-nori 플러그인이 없으면 생성 실패
+            print(f"[WARN] {profile} 인덱스 생성 실패: {e}")
+            continue
+
+        stats = es.indices.stats(index=index_name, metric=["store", "docs"])["_all"]["primaries"]
+        latencies, accuracy = run_queries(index_name, profile, labeled, args.repeat)
+        report.append({
+            "profile": profile,
+            "size_mb": stats["store"]["size_in_bytes"] / 1024 / 1024,
+            "p50": statistics.median(latencies) if latencies else 0.0,
+            "p95": percentile(latencies, 0.95) if latencies else 0.0,
+            "accuracy": accuracy
+        })
+
+        if not args.keep:
+            es.indices.delete(index=index_name)
+
+    print(f"{'profile':<10}{'size(MB)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'top-1':>8}")
+    for r in report:
+        print(f"{r['profile']:<10}{r['size_mb']:>10.2f}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['accuracy']:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
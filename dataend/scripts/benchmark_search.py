@@ -0,0 +1,225 @@
+import os
+
+# 오프라인 실행: 앱 모듈을 불러오기 전에 DB/캐시 설정을 로컬 값으로 채움 (엔진은 연결 없이 생성만 됨)
+os.environ.setdefault("DB_USER", "bench")
+os.environ.setdefault("DB_PASSWORD", "bench")
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "3306")
+os.environ.setdefault("DB_NAME", "bench")
+os.environ.setdefault("REMAP_CACHE_PATH", ":memory:")
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from types import SimpleNamespace
+from elasticsearch import AsyncElasticsearch
+from repositories import catalog_manager, IngredientCatalog, Ingredient
+from services import search_ingredients, llm_client
+from services.remap_cache import normalize_name
+from services.shortlist import NgramIndex
+from es_profiles import to_document
+from observability import REMAP_PATHS
+from benchmark_analysis import load_labeled, percentile
+from main import search_products
+
+import re
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+# /search 오프라인 벤치마크: 기록된 요청을 search_products에 재생하고 처리량/지연/토큰/정확도를 보고
+# 사용법: python scripts/benchmark_search.py --catalog catalog.csv --corpus corpus.jsonl
+#         [--labels labeled.csv] [--responses responses.json] [--llm-latency 0.8] [--concurrency 8] [--repeat 2]
+#         [--es-url http://localhost:9200]
+# catalog.csv: ingredientId,ingredientName,categoryId,categoryName
+# corpus.jsonl: 한 줄에 요청 하나, {"ingredient_names": ["토마토", "대파 1단"]}
+# responses.json: {"입력명": "매핑될 ingredientName"} (없는 입력은 ES top-1을 그대로 응답)
+
+_SINGLE_INPUT = re.compile(r"사용자 입력: (.*)\nElasticsearch 결과: (.*)\n")
+_BATCH_INPUT = re.compile(r"사용자 입력 목록:\n(.*?)\n\n", re.S)
+
+
+def estimate_tokens(text: str) -> int:
+    # tokenizer 없이 대략적인 값 (UTF-8 4바이트당 1토큰)
+    return max(1, len(text.encode("utf-8")) // 4)
+
+
+class FakeOpenAI:
+    """chat.completions.create만 흉내내는 OpenAI 대역. 지연은 정규분포로 뽑고, 응답은 기록된 매핑을 사용."""
+
+    def __init__(self, responses: dict, latency: float, jitter: float):
+        self.responses = {normalize_name(k): v for k, v in responses.items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def answer(self, input_name: str, es_top: str) -> str:
+        return self.responses.get(normalize_name(input_name), es_top)
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        prompt = "\n".join(m["content"] for m in kwargs["messages"] if isinstance(m["content"], str))
+        batch = _BATCH_INPUT.search(prompt)
+        if batch:
+            items = json.loads(batch.group(1))
+            content = json.dumps({"results": [
+                {"index": item["index"], "ingredientName": self.answer(item["input"], item["elasticsearch"])}
+                for item in items
+            ]}, ensure_ascii=False)
+        else:
+            input_name, es_top = _SINGLE_INPUT.search(prompt).groups()
+            content = json.dumps({"ingredientName": self.answer(input_name, es_top)}, ensure_ascii=False)
+
+        usage = SimpleNamespace(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(content))
+        self.calls += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+class StubElasticsearch:
+    """search/msearch만 지원하는 프로세스 내 ES 대역.
+
+    정확 일치 > 공백 제거 일치 > bigram Dice 순으로 점수를 매겨 build_query의 가중치 순서를 흉내낸다.
+    """
+
+    def __init__(self, catalog, latency: float):
+        self.index = NgramIndex(catalog)
+        self.docs = {
+            r.ingredientName: to_document({
+                "ingredientId": r.ingredientId,
+                "ingredientName": r.ingredientName,
+                "categoryId": r.categoryId,
+                "categoryName": r.categoryName
+            })
+            for r in catalog.by_name.values()
+        }
+        self.latency = latency
+
+    def _hits(self, body):
+        name = body["query"]["bool"]["should"][0]["term"]["ingredientName.keyword"]["value"]
+        scores = {candidate: score * 2 for candidate, score in self.index.top_k(name, body["size"] * 2)}
+        nospace = name.replace(" ", "")
+        for candidate in self.docs:
+            if candidate == name:
+                scores[candidate] = scores.get(candidate, 0) + 10
+            elif candidate.replace(" ", "") == nospace:
+                scores[candidate] = scores.get(candidate, 0) + 5
+
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:body["size"]]
+        return {"hits": {"hits": [{"_source": self.docs[n], "_score": s} for n, s in ranked]}}
+
+    async def search(self, index, body):
+        await asyncio.sleep(self.latency)
+        return self._hits(body)
+
+    async def msearch(self, searches):
+        await asyncio.sleep(self.latency)
+        return {"responses": [self._hits(body) for body in searches[1::2]]}
+
+
+def load_catalog(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        records = [
+            Ingredient(int(row["ingredientId"]), row["ingredientName"], int(row["categoryId"]), row["categoryName"])
+            for row in csv.DictReader(f)
+        ]
+    return IngredientCatalog(sorted(records, key=lambda r: r.ingredientId))
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["ingredient_names"] for line in f if line.strip()]
+
+
+def remap_path_totals():
+    return {
+        sample.labels["path"]: sample.value
+        for metric in REMAP_PATHS.collect() for sample in metric.samples if sample.name.endswith("_total")
+    }
+
+
+async def run_pass(corpus, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    predictions = {}
+
+    async def replay(names):
+        async with limit:
+            started = time.perf_counter()
+            results = await search_products(ingredient_names=names)
+            latencies.append(time.perf_counter() - started)
+        mapped = {r["input_name"]: r["ingredientName"] for r in results}
+        for name in names:
+            # 응답에서 빠진 입력은 '제외'로 처리된 것
+            predictions[name] = mapped.get(name, "제외")
+
+    started = time.perf_counter()
+    await asyncio.gather(*[replay(names) for names in corpus])
+    return time.perf_counter() - started, latencies, predictions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="/search 오프라인 벤치마크")
+    parser.add_argument("--catalog", required=True, help="ingredientId,ingredientName,categoryId,categoryName 컬럼의 CSV")
+    parser.add_argument("--corpus", required=True, help="요청별 ingredient_names를 담은 JSONL")
+    parser.add_argument("--labels", help="input_name,expected 컬럼의 CSV (top-1 정확도 계산)")
+    parser.add_argument("--responses", help="입력명 -> 모델 응답 ingredientName JSON")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="OpenAI 대역 평균 지연(초)")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="OpenAI 대역 지연 표준편차(초)")
+    parser.add_argument("--es-latency", type=float, default=0.005, help="ES 대역 지연(초)")
+    parser.add_argument("--es-url", help="지정하면 대역 대신 로컬 ES 컨테이너 사용 (sync_to_es.py로 색인된 products alias)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=2, help="반복 횟수 (첫 회는 캐시가 빈 상태)")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog)
+    corpus = load_corpus(args.corpus)
+    labeled = load_labeled(args.labels) if args.labels else []
+    responses = {}
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            responses = json.load(f)
+
+    # 카탈로그를 직접 게시하고 구독자(remap 캐시)에 알림
+    catalog_manager.catalog = catalog
+    catalog_manager.last_refreshed_at = time.time()
+    search_ingredients._on_catalog_refresh(catalog)
+
+    fake = FakeOpenAI(responses, args.llm_latency, args.llm_jitter)
+    llm_client.client = fake
+    search_ingredients.es = AsyncElasticsearch(args.es_url) if args.es_url else StubElasticsearch(catalog, args.es_latency)
+
+    names = sum(len(names) for names in corpus)
+    print(f"[INFO] 카탈로그 {len(catalog)}건, 요청 {len(corpus)}건 (입력 {names}개), 동시성 {args.concurrency}")
+    print(f"{'pass':<6}{'req/s':>8}{'names/s':>9}{'p50(ms)':>9}{'p95(ms)':>9}{'p99(ms)':>9}"
+          f"{'llm':>6}{'tok(in)':>9}{'tok(out)':>9}{'top-1':>8}  paths")
+
+    for i in range(args.repeat):
+        calls, prompt_tokens, completion_tokens = fake.calls, fake.prompt_tokens, fake.completion_tokens
+        paths_before = remap_path_totals()
+
+        elapsed, latencies, predictions = await run_pass(corpus, args.concurrency)
+
+        paths = {p: int(v - paths_before.get(p, 0)) for p, v in remap_path_totals().items() if v - paths_before.get(p, 0)}
+        scored = [(predictions[name], expected) for name, expected in labeled if name in predictions]
+        accuracy = f"{sum(p == e for p, e in scored) / len(scored):.1%}" if scored else "-"
+        ms = [latency * 1000 for latency in latencies]
+        print(f"{i + 1:<6}{len(corpus) / elapsed:>8.1f}{names / elapsed:>9.1f}"
+              f"{statistics.median(ms):>9.1f}{percentile(ms, 0.95):>9.1f}{percentile(ms, 0.99):>9.1f}"
+              f"{fake.calls - calls:>6}{fake.prompt_tokens - prompt_tokens:>9}{fake.completion_tokens - completion_tokens:>9}"
+              f"{accuracy:>8}  {paths}")
+
+    if args.es_url:
+        await search_ingredients.es.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
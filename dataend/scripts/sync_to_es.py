@@ -1,196 +1,306 @@
 from elasticsearch import Elasticsearch
 from datetime import datetime, timezone
-from elasticsearch.helpers import bulk
-from pymysql.cursors import DictCursor
+from elasticsearch.helpers import parallel_bulk
+from es_profiles import ANALYSIS_PROFILE, build_mapping, build_query, to_document
+from db import stream_ingredients
 
 import os
-import pymysql
 import json
+import copy
+import argparse
 
+# 검색은 항상 이 alias로 하고, 실제 데이터는 버전이 붙은 인덱스(products_v<시각>)에 둔다
 INDEX_NAME = "products"
+REINDEX_KEEP = int(os.getenv("REINDEX_KEEP", 2))  # 롤백용으로 남겨둘 이전 버전 수
+
+# 한 번에 비교/반영하는 ID 수, bulk 설정, 재시작용 체크포인트 파일
+SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", 1000))
+SYNC_BULK_CHUNK_SIZE = int(os.getenv("SYNC_BULK_CHUNK_SIZE", 500))
+SYNC_BULK_THREADS = int(os.getenv("SYNC_BULK_THREADS", 4))
+SYNC_CHECKPOINT_PATH = os.getenv("SYNC_CHECKPOINT_PATH", "sync_to_es.checkpoint.json")
+PIT_KEEP_ALIVE = "2m"
 
 es = Elasticsearch("http://elasticsearch:9200").options(request_timeout=60)
 
-mapping = {
-    "settings": {
-        "index": {
-            "max_ngram_diff": 20,
-            "number_of_shards": 1,
-            "number_of_replicas": 1
-        },
-        "analysis": {
-            "analyzer": {
-                "korean_ngram_analyzer": {
-                    "type": "custom",
-                    "tokenizer": "korean_ngram_tokenizer"
-                },
-                "korean_edge_ngram_analyzer": {
-                    "type": "custom",
-                    "tokenizer": "korean_edge_ngram_tokenizer"
-                }
-            },
-            "tokenizer": {
-                "korean_ngram_tokenizer": {
-                    "type": "ngram",
-                    "min_gram": 2,
-                    "max_gram": 20,
-                    "token_chars": ["letter", "digit"]
-                },
-                "korean_edge_ngram_tokenizer": {
-                    "type": "edge_ngram",
-                    "min_gram": 1,
-                    "max_gram": 20,
-                    "token_chars": ["letter", "digit"]
-                }
-            }
-        }
-    },
-    "mappings": {
-        "properties": {
-            "ingredientId": {"type": "keyword"},
-            "categoryId": {"type": "keyword"},
-            "ingredientName": {
-                "type": "text",
-                "analyzer": "korean_ngram_analyzer",
-                "search_analyzer": "korean_ngram_analyzer",
-                "fields": {
-                    "edge": {
-                        "type": "text",
-                        "analyzer": "korean_edge_ngram_analyzer",
-                        "search_analyzer": "korean_edge_ngram_analyzer"
-                    },
-                    "keyword": {"type": "keyword"}
-                }
-            },
-            "ingredientName_nospace": {
-                "type": "text",
-                "analyzer": "korean_ngram_analyzer",
-                "search_analyzer": "korean_ngram_analyzer"
-            },
-            "categoryName": {"type": "keyword"},
-            "updatedAt": {"type": "date"}
-        }
-    }
-}
+mapping = build_mapping(ANALYSIS_PROFILE)
+
+def new_index_name():
+    return f"{INDEX_NAME}_v{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
 
 def create_index_if_not_exists():
     if es.indices.exists(index=INDEX_NAME):
         print(f"인덱스 '{INDEX_NAME}' 이미 존재")
         return False  # 이미 존재
     else:
-        es.indices.create(index=INDEX_NAME, body=mapping)
-        print(f"인덱스 '{INDEX_NAME}' 생성 완료")
+        index_name = new_index_name()
+        body = copy.deepcopy(mapping)
+        body["aliases"] = {INDEX_NAME: {}}
+        es.indices.create(index=index_name, body=body)
+        print(f"인덱스 '{index_name}' 생성 완료 (alias: {INDEX_NAME})")
         return True  # 새로 생성
 
-def sync_to_es():
+def alias_targets():
+    if not es.indices.exists_alias(name=INDEX_NAME):
+        return []
+    return sorted(es.indices.get_alias(name=INDEX_NAME).keys())
+
+def versioned_indices():
+    return sorted(name for name in es.indices.get(index=f"{INDEX_NAME}_v*").keys())
+
+def warm_up(index_name, sample_size=100):
+    # 실제 검색과 같은 형태의 쿼리로 캐시/세그먼트를 미리 데움
+    resp = es.search(index=index_name, size=sample_size, source=["ingredientName"], query={"match_all": {}})
+    names = [hit["_source"]["ingredientName"] for hit in resp["hits"]["hits"]]
+    searches = []
+    for name in names:
+        searches.append({"index": index_name})
+        searches.append(build_query(name, 1))
+    if searches:
+        es.msearch(searches=searches)
+    print(f"[INFO] 워밍업 쿼리 {len(names)}건 실행")
+
+def swap_alias(target_index):
+    # alias를 한 번의 요청으로 원자적으로 교체
+    actions = [{"remove": {"index": index, "alias": INDEX_NAME}} for index in alias_targets() if index != target_index]
+    if es.indices.exists(index=INDEX_NAME) and not es.indices.exists_alias(name=INDEX_NAME):
+        # alias 도입 전의 단일 'products' 인덱스는 같은 이름의 alias와 공존할 수 없으므로 교체와 동시에 삭제
+        print(f"[WARN] 기존 '{INDEX_NAME}' 인덱스는 alias로 대체되며 삭제됩니다 (롤백 불가)")
+        actions.append({"remove_index": {"index": INDEX_NAME}})
+    actions.append({"add": {"index": target_index, "alias": INDEX_NAME}})
+    es.indices.update_aliases(actions=actions)
+    print(f"[INFO] alias '{INDEX_NAME}' -> '{target_index}'")
+
+def prune_old_indices(current_index):
+    old = [index for index in versioned_indices() if index < current_index]
+    for index in old[:-REINDEX_KEEP] if REINDEX_KEEP > 0 else old:
+        es.indices.delete(index=index)
+        print(f"[INFO] 이전 인덱스 '{index}' 삭제")
+
+def reindex():
+    # 새 버전 인덱스를 만들어 적재한 뒤 alias를 교체 (검색 중단 없음)
     if not es.ping():
         print("[ERROR] Elasticsearch 연결 실패")
         return
 
-    create_index_if_not_exists()
+    index_name = new_index_name()
+    settings = mapping["settings"]["index"]
 
-    count_before = es.count(index=INDEX_NAME)["count"]
-    print(f"[INFO] 동기화 전 문서 수: {count_before}")
+    # bulk 적재 동안은 복제본/refresh 비활성화
+    body = copy.deepcopy(mapping)
+    body["settings"]["index"].update({"number_of_replicas": 0, "refresh_interval": "-1"})
+    es.indices.create(index=index_name, body=body)
+    print(f"[INFO] 새 인덱스 '{index_name}' 생성")
 
-    # MySQL 연결
     try:
-        conn = pymysql.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME"),
-            port=int(os.getenv("DB_PORT")),
-            cursorclass=DictCursor
+        stats = {"success": 0, "failed": 0}
+        actions = (
+            {"_index": index_name, "_id": str(row["ingredientId"]), "_source": to_source(row)}
+            for row in iter_mysql_rows()
         )
-        print("[INFO] MySQL 연결 성공")
+        flush_actions(actions, stats)
+        print(f"[INFO] 적재 완료: {stats['success']}건, 실패: {stats['failed']}건")
+
+        if stats["failed"]:
+            print(f"[ERROR] 적재 실패가 있어 alias를 교체하지 않습니다. '{index_name}'은 확인 후 삭제하세요")
+            return
+
+        # 설정 복원 후 refresh, 세그먼트 병합, 워밍업
+        es.indices.put_settings(index=index_name, settings={
+            "number_of_replicas": settings["number_of_replicas"],
+            "refresh_interval": settings.get("refresh_interval", "1s")
+        })
+        es.indices.refresh(index=index_name)
+        es.indices.forcemerge(index=index_name, max_num_segments=1)
+        es.cluster.health(index=index_name, wait_for_status="yellow", timeout="60s")
+        warm_up(index_name)
     except Exception as e:
-        print("[ERROR] MySQL 연결 실패:", e)
+        # MySQL 조회 실패 등: alias는 그대로 두고 만들던 인덱스만 정리
+        print("[ERROR] 재색인 실패:", e)
+        es.indices.delete(index=index_name)
+        return
+
+    swap_alias(index_name)
+    prune_old_indices(index_name)
+
+def rollback():
+    # alias를 현재 인덱스 바로 이전 버전으로 되돌림
+    current = alias_targets()
+    candidates = [index for index in versioned_indices() if not current or index < min(current)]
+    if not candidates:
+        print("[ERROR] 롤백할 이전 인덱스가 없습니다")
         return
+    swap_alias(candidates[-1])
+
+def to_source(row, profile=ANALYSIS_PROFILE):
+    return to_document({
+        "ingredientId": row["ingredientId"],
+        "ingredientName": row["ingredientName"],
+        "categoryName": row["categoryName"],
+        "categoryId": row["categoryId"],
+        "updatedAt": row["updatedAt"].strftime("%Y-%m-%dT%H:%M:%S") if hasattr(row["updatedAt"], "strftime") else row["updatedAt"]
+    }, profile)
+
+def iter_mysql_rows(after_id=None):
+    # 공용 DB 계층의 서버 사이드 커서로 ID(문자열) 순서대로 스트리밍 (ES keyword 정렬 순서와 맞춤)
+    for row in stream_ingredients(after_id, SYNC_CHUNK_SIZE):
+        yield row._mapping
+
+def iter_es_docs(index_name, after_id=None):
+    # point-in-time + search_after로 인덱스 전체를 ingredientId 순서대로 순회
+    pit_id = es.open_point_in_time(index=index_name, keep_alive=PIT_KEEP_ALIVE)["id"]
+    query = {"range": {"ingredientId": {"gt": after_id}}} if after_id is not None else {"match_all": {}}
+    search_after = None
+
+    try:
+        while True:
+            kwargs = {"search_after": search_after} if search_after is not None else {}
+            resp = es.search(
+                pit={"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                query=query,
+                sort=[{"ingredientId": "asc"}],
+                size=SYNC_CHUNK_SIZE,
+                **kwargs
+            )
+            hits = resp["hits"]["hits"]
+            if not hits:
+                break
+            pit_id = resp.get("pit_id", pit_id)
+            yield from hits
+            search_after = hits[-1]["sort"]
+    finally:
+        es.close_point_in_time(id=pit_id)
+
+def diff_actions(rows, docs, index_name, stats):
+    # 두 정렬된 스트림을 병합하며 (doc_id, action) 생성
+    row = next(rows, None)
+    doc = next(docs, None)
+
+    while row is not None or doc is not None:
+        row_id = str(row["ingredientId"]) if row is not None else None
+        doc_id = doc["_id"] if doc is not None else None
 
-    cursor = conn.cursor()
-
-    # MySQL 전체 데이터 조회
-    query = """
-        SELECT i.id as ingredientId,
-               i.name as ingredientName,
-               i.updatedAt,
-               c.id as categoryId,
-               c.name as categoryName
-        FROM ingredients i
-        JOIN categories c ON i.categoryId = c.id
-    """
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    print(f"[INFO] MySQL에서 가져온 전체 데이터 수: {len(rows)}")
-
-    # ES에 존재하는 문서 조회
-    resp = es.search(index=INDEX_NAME, size=2000, body={"query": {"match_all": {}}})
-    existing_docs = {doc["_id"]: doc["_source"] for doc in resp["hits"]["hits"]}
-
-    mysql_ids = set()
-    actions = []
-
-    # 신규/변경/삭제 카운트
-    new_count = 0
-    update_count = 0
-
-    # 1. 신규/변경 문서 처리
-    for row in rows:
-        doc_id = str(row["ingredientId"])
-        mysql_ids.add(doc_id)
-
-        source = {
-            "ingredientId": row["ingredientId"],
-            "ingredientName": row["ingredientName"],
-            "ingredientName_nospace": row["ingredientName"].replace(" ", ""),
-            "categoryName": row["categoryName"],
-            "categoryId": row["categoryId"],
-            "updatedAt": row["updatedAt"].strftime("%Y-%m-%dT%H:%M:%S") if hasattr(row["updatedAt"], "strftime") else row["updatedAt"]
-        }
-
-        if doc_id not in existing_docs:
+        if doc is None or (row is not None and row_id < doc_id):
             # 신규 문서
-            actions.append({"_index": INDEX_NAME, "_id": doc_id, "_source": source})
-            new_count += 1
-            print(f"[NEW] ID: {doc_id}, 내용: {source}")
+            source = to_source(row)
+            stats["new"] += 1
+            print(f"[NEW] ID: {row_id}, 내용: {source}")
+            yield row_id, {"_index": index_name, "_id": row_id, "_source": source}
+            row = next(rows, None)
+        elif row is None or doc_id < row_id:
+            # ES에만 존재하는 문서 삭제
+            stats["delete"] += 1
+            print(f"[DELETE] ID: {doc_id}, 내용: {doc['_source']}")
+            yield doc_id, {"_op_type": "delete", "_index": index_name, "_id": doc_id}
+            doc = next(docs, None)
         else:
             # 변경 여부 확인 (변경된 컬럼만 표시)
-            old = existing_docs[doc_id]
+            source = to_source(row)
+            old = doc["_source"]
             differences = {}
             for key in source:
                 if source[key] != old.get(key):
                     differences[key] = {"이전": old.get(key), "이후": source[key]}
 
             if differences:
-                actions.append({"_index": INDEX_NAME, "_id": doc_id, "_source": source})
-                update_count += 1
-                print(f"[UPDATE] ID: {doc_id}")
+                stats["update"] += 1
+                print(f"[UPDATE] ID: {row_id}")
                 for k, v in differences.items():
                     print(f" - {k}: [이전] {v['이전']} → [이후] {v['이후']}")
+                yield row_id, {"_index": index_name, "_id": row_id, "_source": source}
+            else:
+                yield row_id, None
+            row = next(rows, None)
+            doc = next(docs, None)
 
-    # 2. ES에만 존재하는 문서 삭제
-    to_delete = set(existing_docs.keys()) - mysql_ids
-    delete_count = len(to_delete)
-    for doc_id in to_delete:
-        doc = existing_docs[doc_id]
-        print(f"[DELETE] ID: {doc_id}, 내용: {doc}")
-        es.options(ignore_status=[404]).delete(index=INDEX_NAME, id=doc_id)
-
-    # 3. Bulk 색인
-    if actions:
-        success, _ = bulk(es, actions)
-    else:
-        success = 0
+def load_checkpoint():
+    if not os.path.exists(SYNC_CHECKPOINT_PATH):
+        return None
+    with open(SYNC_CHECKPOINT_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_checkpoint(last_id, stats):
+    tmp_path = SYNC_CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id, "stats": stats}, f)
+    os.replace(tmp_path, SYNC_CHECKPOINT_PATH)
+
+def flush_actions(actions, stats):
+    for ok, item in parallel_bulk(
+        es, actions,
+        thread_count=SYNC_BULK_THREADS,
+        chunk_size=SYNC_BULK_CHUNK_SIZE,
+        raise_on_error=False,
+        raise_on_exception=True
+    ):
+        op, result = next(iter(item.items()))
+        if ok or (op == "delete" and result.get("status") == 404):
+            stats["success"] += 1
+        else:
+            stats["failed"] += 1
+            print(f"[ERROR] bulk {op} 실패: {result}")
+
+def sync_to_es(restart=False):
+    if not es.ping():
+        print("[ERROR] Elasticsearch 연결 실패")
+        return
+
+    create_index_if_not_exists()
+
+    count_before = es.count(index=INDEX_NAME)["count"]
+    print(f"[INFO] 동기화 전 문서 수: {count_before}")
+
+    checkpoint = None if restart else load_checkpoint()
+    after_id = checkpoint["last_id"] if checkpoint else None
+    stats = checkpoint["stats"] if checkpoint else {"new": 0, "update": 0, "delete": 0, "success": 0, "failed": 0}
+    if after_id is not None:
+        print(f"[INFO] 체크포인트에서 재개: ID {after_id} 이후")
+
+    rows = iter_mysql_rows(after_id)
+    docs = iter_es_docs(INDEX_NAME, after_id)
+    try:
+
+        # SYNC_CHUNK_SIZE개 ID마다 bulk 반영 후 체크포인트 저장 (메모리 사용량은 청크 크기로 제한)
+        actions = []
+        processed = 0
+        last_id = after_id
+        for doc_id, action in diff_actions(rows, docs, INDEX_NAME, stats):
+            if action is not None:
+                actions.append(action)
+            processed += 1
+            last_id = doc_id
 
-    # 4. 요약 출력
-    print(f"[INFO] 색인/갱신 완료: {success}건 (신규: {new_count}, 변경: {update_count}, 삭제: {delete_count})")
+            if processed % SYNC_CHUNK_SIZE == 0:
+                flush_actions(actions, stats)
+                actions = []
+                save_checkpoint(last_id, stats)
+
+        flush_actions(actions, stats)
+    finally:
+        docs.close()
+        rows.close()
+
+    if os.path.exists(SYNC_CHECKPOINT_PATH):
+        os.remove(SYNC_CHECKPOINT_PATH)
+
+    # 요약 출력
+    print(f"[INFO] 색인/갱신/삭제 완료: {stats['success']}건, 실패: {stats['failed']}건 "
+          f"(신규: {stats['new']}, 변경: {stats['update']}, 삭제: {stats['delete']})")
 
     es.indices.refresh(index=INDEX_NAME)
-    conn.close()
-    print("[INFO] MySQL 연결 종료")
 
     count_after = es.count(index=INDEX_NAME)["count"]
     print(f"[INFO] 동기화 후 문서 수: {count_after}")
 
 if __name__ == "__main__":
-    sync_to_es()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="MySQL ingredients -> Elasticsearch 동기화")
+    parser.add_argument("--restart", action="store_true", help="체크포인트를 무시하고 처음부터 동기화")
+    parser.add_argument("--reindex", action="store_true", help="새 버전 인덱스로 전체 재색인 후 alias 교체")
+    parser.add_argument("--rollback", action="store_true", help="alias를 이전 버전 인덱스로 되돌림")
+    args = parser.parse_args()
+
+    if args.reindex:
+        reindex()
+    elif args.rollback:
+        rollback()
+    else:
+        sync_to_es(restart=args.restart)
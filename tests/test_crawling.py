@@ -0,0 +1,160 @@
+# crawling.py --mode http를 로컬 대역 서버(crawl_fixture_server.py)에 대고 확인
+# 사용법: python -m pytest tests/test_crawling.py
+
+import os
+import sys
+import csv
+import json
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("selenium")
+pytest.importorskip("webdriver_manager")
+pytest.importorskip("pymysql")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+import crawling
+from crawl_fixture_server import CHILDREN_PATH, DETAIL_PATH, build_tree, create_app
+
+FANOUT = 3
+
+
+def expected_rows(fanout):
+    # 대역 서버 트리에서 나와야 하는 CSV 행 (하위가 없는 분류는 빈 칸과 빈 예시)
+    children, examples = build_tree(fanout)
+    rows = set()
+
+    def walk(code, path):
+        if len(path) == 4:
+            rows.update((*path, example.strip()) for example in examples[code].split(","))
+        elif not children.get(code):
+            rows.add((*path, *[""] * (4 - len(path)), ""))
+        else:
+            for child_code, name in children[code]:
+                walk(child_code, (*path, name))
+
+    for code, name in children[""]:
+        walk(code, (name,))
+    return rows
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        assert next(reader) == crawling.CSV_HEADER
+        return [tuple(row) for row in reader]
+
+
+@pytest.fixture
+def fixture_server(monkeypatch, tmp_path):
+    # 각 URL의 첫 요청은 429로 응답해 재시도 경로를 항상 거치게 함
+    counts = {"429": 0, "detail": 0}
+    seen = set()
+
+    @web.middleware
+    async def throttle_first(request, handler):
+        if request.path.endswith("/detail"):
+            counts["detail"] += 1
+        if request.path_qs not in seen:
+            seen.add(request.path_qs)
+            counts["429"] += 1
+            raise web.HTTPTooManyRequests()
+        return await handler(request)
+
+    def make_app():
+        # aiohttp 앱은 이벤트 루프마다 새로 만들어야 하므로 실행마다 생성 (429 기록은 공유)
+        app = create_app(FANOUT, 0, 0)
+        app.middlewares.append(throttle_first)
+        return app
+
+    monkeypatch.setattr(crawling, "CRAWL_JOURNAL_PATH", str(tmp_path / "crawl_journal.jsonl"))
+    monkeypatch.setattr(crawling, "CRAWL_SNAPSHOT_PATH", str(tmp_path / "crawl_snapshot.json"))
+    monkeypatch.setattr(crawling, "CRAWL_RETRIES", 2)
+    monkeypatch.setattr(crawling, "CRAWL_CHILDREN_PATH", CHILDREN_PATH)
+    monkeypatch.setattr(crawling, "CRAWL_DETAIL_PATH", DETAIL_PATH)
+    # run_crawl이 서버 포트에 맞춰 바꾸므로 테스트 후 원래 값으로 되돌림
+    monkeypatch.setattr(crawling, "CRAWL_BASE_URL", crawling.CRAWL_BASE_URL)
+    return make_app, counts
+
+
+def run_crawl(make_app, csv_path, restart=False):
+    async def run():
+        runner = web.AppRunner(make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        crawling.CRAWL_BASE_URL = f"http://{host}:{port}"
+        try:
+            await crawling.crawl_http(sink, journal, concurrency=4, rate=1000)
+        finally:
+            await runner.cleanup()
+
+    journal = crawling.CrawlJournal(restart)
+    sink = crawling.CsvSink(csv_path, append=journal.resumed)
+    try:
+        asyncio.run(run())
+    except BaseException:
+        journal.close()
+        raise
+    finally:
+        sink.close()
+    return journal
+
+
+def test_http_crawl_retries_and_resumes(fixture_server, tmp_path):
+    make_app, counts = fixture_server
+    csv_path = str(tmp_path / "product_categories.csv")
+    expected = expected_rows(FANOUT)
+
+    # 전체 수집: 모든 요청이 한 번씩 429를 받은 뒤 재시도로 성공
+    journal = run_crawl(make_app, csv_path)
+    rows = read_rows(csv_path)
+    assert counts["429"] > 0
+    assert sorted(rows) == sorted(expected)
+    subtrees = len(journal.done)
+    journal.close()
+
+    # 중단된 실행 흉내: 저널은 앞 3개 하위 트리와 잘린 줄만, CSV는 그 하위 트리의 행만 남김
+    with open(crawling.CRAWL_JOURNAL_PATH, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(crawling.CRAWL_JOURNAL_PATH, "w", encoding="utf-8") as f:
+        f.writelines(lines[:3])
+        f.write(lines[3][:10])
+    kept_paths = [tuple(json.loads(line)["path"]) for line in lines[:3]]
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(crawling.CSV_HEADER)
+        writer.writerows(row for row in rows if any(row[:len(path)] == path for path in kept_paths))
+
+    counts["detail"] = 0
+    journal = run_crawl(make_app, csv_path)
+    assert journal.resumed
+    assert journal.stats["resumed"] == 3
+    assert len(journal.done) == subtrees
+    assert sorted(read_rows(csv_path)) == sorted(expected)
+    journal.finish()
+    assert os.path.exists(crawling.CRAWL_SNAPSHOT_PATH)
+    assert not os.path.exists(crawling.CRAWL_JOURNAL_PATH)
+
+    # 다음 실행: 세분류 목록이 그대로이므로 예시를 다시 받지 않음
+    counts["detail"] = 0
+    journal = run_crawl(make_app, str(tmp_path / "second.csv"), restart=True)
+    assert journal.stats["fetched"] == 0
+    assert journal.stats["reused"] > 0
+    assert counts["detail"] == 0
+    journal.close()
+
+
+def test_http_crawl_requires_endpoint_settings(monkeypatch, tmp_path):
+    # 실제 사이트의 경로가 확인되지 않았으므로 지정하지 않으면 요청 전에 실패해야 함
+    monkeypatch.setattr(crawling, "CRAWL_BASE_URL", "https://www.allproductkorea.or.kr")
+    monkeypatch.setattr(crawling, "CRAWL_CHILDREN_PATH", "")
+    monkeypatch.setattr(crawling, "CRAWL_DETAIL_PATH", "")
+    assert crawling.missing_http_settings() == ["CRAWL_CHILDREN_PATH", "CRAWL_DETAIL_PATH"]
+    with pytest.raises(ValueError, match="CRAWL_CHILDREN_PATH"):
+        asyncio.run(crawling.crawl_http(None, None))
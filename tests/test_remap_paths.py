@@ -0,0 +1,67 @@
+# 동시에 들어온 같은 입력의 remap 처리 경로("llm"/"coalesced") 확인
+# 사용법: python -m pytest tests/test_remap_paths.py
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 앱 모듈을 불러오기 전에 DB/캐시 설정을 로컬 값으로 채움 (엔진은 연결 없이 생성만 됨)
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "3306")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("REMAP_CACHE_PATH", ":memory:")
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+for module in ("elasticsearch", "openai", "sqlalchemy", "aiomysql", "pymysql", "prometheus_client", "numpy", "PIL"):
+    pytest.importorskip(module)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataend", "app"))
+
+from services import search_ingredients
+from services.remap_cache import RemapCache
+from observability import REMAP_PATHS
+
+
+def remap_path_totals():
+    return {
+        sample.labels["path"]: sample.value
+        for metric in REMAP_PATHS.collect() for sample in metric.samples if sample.name.endswith("_total")
+    }
+
+
+def test_overlapping_requests_report_one_llm_and_one_coalesced(monkeypatch):
+    calls = []
+
+    async def fake_remap_batch(remap_inputs):
+        calls.append([name for name, _, _ in remap_inputs])
+        await asyncio.sleep(0.05)
+        return [
+            {"input_name": name, "ingredientId": 1, "ingredientName": "양파", "categoryId": 1, "categoryName": "채소"}
+            for name, _, _ in remap_inputs
+        ]
+
+    monkeypatch.setattr(search_ingredients, "ask_openai_for_remap_batch", fake_remap_batch)
+    monkeypatch.setattr(search_ingredients, "remap_cache", RemapCache(":memory:"))
+
+    # ES 결과가 없어 우회/캐시 없이 LLM 매핑으로 가는 입력
+    es_results = [("국산 양파 1.5kg", [])]
+
+    async def collect():
+        return [(i, result["ingredientName"], path) async for i, result, path in search_ingredients.iter_remap_results(es_results)]
+
+    async def run():
+        return await asyncio.gather(collect(), collect())
+
+    before = remap_path_totals()
+    first, second = asyncio.run(run())
+    after = remap_path_totals()
+
+    assert calls == [["국산 양파 1.5kg"]]
+    assert sorted([first[0][2], second[0][2]]) == ["coalesced", "llm"]
+    assert first[0][1] == second[0][1] == "양파"
+    assert after.get("llm", 0) - before.get("llm", 0) == 1
+    assert after.get("coalesced", 0) - before.get("coalesced", 0) == 1